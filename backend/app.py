@@ -2,10 +2,9 @@
 #need to be in backend folder
 
 from __future__ import annotations
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import os
-import fitz
 import uuid
 from datetime import datetime
 
@@ -17,6 +16,9 @@ from datetime import datetime
 # gemini tts
 
 import io
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import threading
 #websocket-client logic
 import asyncio
 import websockets
@@ -26,8 +28,10 @@ import json
 #import whisper
 #import tempfile
 
+import traceback
+import itertools
+
 #questionnaire copying
-import shutil
 import os
 import json
 from flask import Flask, request, jsonify
@@ -44,7 +48,7 @@ from dotenv import load_dotenv  #load .env file automatically
 import google.generativeai as genai #gemini ai lib
 
 #supabase client, database
-from supabase_client import supabase
+from supabase_client import supabase, pooled_rest
 
 #google cloud text-to-speech
 from google.cloud import texttospeech
@@ -57,49 +61,72 @@ load_dotenv()
 
 import tts_service  #moving to after load_dotenv
 
-# Simple rate limiter for Gemini API calls (15 requests per minute limit)
+#content-addressed audio cache (memory LRU + disk) so repeated sentences skip synthesis
+from blob_cache import build_cache, cache_key, normalize_text
+from llm_cache import LLMCache
+from story_store import StoryStore
+from profile_cache import ProfileCache
+from profile_store import ProfileStore
+from pdf_extract import (StorySegmenter, extract_pdf, iter_pdf_pages, segment_story_text, split_sentences,
+                         check_pdf_size, PDFTooLarge, PDFParseTimeout, PDFParseFailed)
+import pdf_extract
+
+# token-bucket rate limiter shared by all workers (see rate_limit.py)
 import time
-from collections import deque
-
-class RateLimiter:
-    def __init__(self, max_calls: int = 10, time_window: int = 60):
-        """
-        Simple rate limiter using sliding window.
-        max_calls: Maximum calls allowed
-        time_window: Time window in seconds
-        """
-        self.max_calls = max_calls
-        self.time_window = time_window
-        self.calls = deque()
-    
-    def is_allowed(self) -> bool:
-        now = time.time()
-        # Remove calls outside the time window
-        while self.calls and self.calls[0] < now - self.time_window:
-            self.calls.popleft()
-        
-        if len(self.calls) < self.max_calls:
-            self.calls.append(now)
-            return True
-        return False
-
-gemini_rate_limiter = RateLimiter(max_calls=10, time_window=60)  # 10 calls per 60 seconds
+import rate_limit
+from rate_limit import RateLimited
+from retry_policy import RetryPolicy, retry_after_hint
+import singleflight
+from singleflight import SingleFlight, Saturated, WaitTimeout
+from llm_stream import SentenceSplitter, StreamTimings, sse_event
 
 # #initialize anthropic claude client, calling the key from .env file
 # claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-#configure gemini api key
-genai.configure(api_key = os.getenv("GOOGLE_API_KEY"))
-
-#initialize gemini model
-gemini_model = genai.GenerativeModel('gemini-2.0-flash-lite')
-
-#initialize google tts client
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("GOOGLE_TTS_CREDENTIALS_PATH")
-tts_client = texttospeech.TextToSpeechClient()
-
-#initialize google sst client
-stt_client = speech.SpeechClient()
+#gemini model (created in startup(), see the bottom of this file)
+GEMINI_MODEL_NAME = 'gemini-2.0-flash-lite'
+gemini_model = None
+
+#cache for gemini completions (memory LRU + optional sqlite tier), see llm_cache.py
+llm_cache = LLMCache(
+    max_bytes=int(float(os.getenv("LLM_CACHE_MEMORY_MB", "16")) * 1024 * 1024),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+    sqlite_path=os.getenv("LLM_CACHE_DB_PATH", os.path.join("user_data", "llm_cache.sqlite3")) or None,
+    sqlite_max_bytes=int(float(os.getenv("LLM_CACHE_DISK_MB", "128")) * 1024 * 1024),
+)
+#single-flight groups: concurrent identical upstream calls share one call (see singleflight.py)
+SINGLEFLIGHT_MAX_WAITERS = int(os.getenv("SINGLEFLIGHT_MAX_WAITERS", "100"))
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "120"))
+GEMINI_FLIGHT = SingleFlight("gemini", SINGLEFLIGHT_MAX_WAITERS, SINGLEFLIGHT_WAIT_SECONDS)
+TTS_FLIGHT = SingleFlight("google_tts", SINGLEFLIGHT_MAX_WAITERS, SINGLEFLIGHT_WAIT_SECONDS)
+GEMINI_TTS_FLIGHT = SingleFlight("gemini_tts", SINGLEFLIGHT_MAX_WAITERS, SINGLEFLIGHT_WAIT_SECONDS,
+                                 stream_workers=int(os.getenv("GEMINI_TTS_STREAM_WORKERS", "8")))
+#token streams for the /stream (sse) routes; each in-flight stream holds a pump thread, and once
+#they're all busy new streams get a 429 rather than queueing (queue time would show up as ttft)
+GEMINI_STREAM_FLIGHT = SingleFlight("gemini_stream", SINGLEFLIGHT_MAX_WAITERS, SINGLEFLIGHT_WAIT_SECONDS,
+                                    stream_workers=int(os.getenv("GEMINI_STREAM_WORKERS", "16")),
+                                    reject_when_busy=True)
+STREAM_BUSY_RETRY_SECONDS = int(os.getenv("STREAM_BUSY_RETRY_SECONDS", "2"))
+STREAM_TIMINGS = StreamTimings()
+#routes whose answers should always be freshly generated, e.g. LLM_CACHE_OPT_OUT=qa_chat,submit_answer
+LLM_CACHE_OPT_OUT = {r.strip() for r in os.getenv("LLM_CACHE_OPT_OUT", "").split(",") if r.strip()}
+
+#google tts / stt clients (created in startup())
+tts_client = None
+stt_client = None
+
+#tts audio cache, sized via env (MB)
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.getcwd(), "tts_cache"))
+tts_cache = build_cache(
+    TTS_CACHE_DIR,
+    memory_mb=float(os.getenv("TTS_CACHE_MEMORY_MB", "64")),
+    disk_mb=float(os.getenv("TTS_CACHE_DISK_MB", "512")),
+    suffix=".audio",
+)
+
+def tts_cache_key(text, voice_name, speaking_rate, pitch, encoding) -> str:
+    """Cache key for one synthesized clip: every parameter that changes the audio."""
+    return cache_key("tts", normalize_text(text), voice_name, speaking_rate, pitch, encoding)
 
 
 app = Flask(__name__) #creates new flask web application 
@@ -110,7 +137,7 @@ CORS(app,
 #makes sure frontend can talk to backend
 
 # registering img generation blueprint:
-from app_story_images import images_bp
+from app_story_images import images_bp, cache_stats as image_cache_stats, recover_jobs
 app.register_blueprint(images_bp, url_prefix='/api')
 
 PROFILE_PATH = os.path.join(os.path.dirname(__file__), "profile.json")
@@ -118,60 +145,263 @@ PROFILE_PATH = os.path.join(os.path.dirname(__file__), "profile.json")
 STORY_STORAGE_PATH = os.path.join(os.getcwd(), "user_data", "stories")
 os.makedirs(STORY_STORAGE_PATH, exist_ok=True)
 
-def _load_profile():
-    if os.path.exists(PROFILE_PATH):
-        with open(PROFILE_PATH, "r") as f:
-            return json.load(f)
-    else:
-        return {"questionnaire": {}, "struggles": []}
+#story metadata lives in an indexed sqlite store; legacy <id>.json files are imported once (in startup())
+story_store = StoryStore(os.getenv("STORY_DB_PATH", os.path.join(os.getcwd(), "user_data", "stories.sqlite3")))
 
-def _save_profile(data):
-    with open(PROFILE_PATH, "w") as f:
-        json.dump(data, f, indent=2)
+#locked + atomic profile.json writes; the frontend/public copy is refreshed in the background
+_mirror_default = os.path.join(os.path.dirname(__file__), "..", "frontend", "public", "profile.json")
+PROFILE_MIRROR_PATH = os.getenv("PROFILE_MIRROR_PATH", _mirror_default)
+if os.getenv("PROFILE_MIRROR_TO_FRONTEND", "true").lower() not in {"1", "true", "yes", "on"} \
+        or not os.path.isdir(os.path.dirname(PROFILE_MIRROR_PATH)):
+    PROFILE_MIRROR_PATH = None
+profile_store = ProfileStore(PROFILE_PATH, mirror_path=PROFILE_MIRROR_PATH)
+
+def _load_profile():
+    return profile_store.load()
+
+#per-user supabase profile rows, invalidated by save_questionnaire
+profile_cache = ProfileCache(
+    max_entries=int(os.getenv("PROFILE_CACHE_MAX_USERS", "1000")),
+    ttl_seconds=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300")),
+)
+
+def _fetch_profile(user_id, access_token):
+    """Profile row from Supabase, or None if the user has none yet."""
+    response = pooled_rest.rest(access_token).table("profiles").select("*").eq("id", user_id).execute()
+    return response.data[0] if response.data else None
+
+def rate_limited_response(e: RateLimited):
+    resp = jsonify({"error": "Too many requests. Please wait a moment and try again."})
+    resp.headers["Retry-After"] = str(max(1, int(e.retry_after + 0.999)))
+    return resp, 429
+
+def gemini_cache_key(prompt, temperature, json_mode=False):
+    if json_mode:
+        return cache_key("gemini", GEMINI_MODEL_NAME, temperature, "json", prompt)
+    return cache_key("gemini", GEMINI_MODEL_NAME, temperature, prompt)
+
+#per-route retry budgets: interactive routes fail fast, background warm-up can wait
+#override with RETRY_<ROUTE>_DEADLINE_SECONDS / _MAX_ATTEMPTS / _BASE_DELAY / _MAX_DELAY
+GEMINI_RETRY_POLICIES = {
+    name: RetryPolicy.from_env(name, policy)
+    for name, policy in {
+        "default":       RetryPolicy(deadline_seconds=20, max_attempts=3),
+        "define_word":   RetryPolicy(deadline_seconds=4, max_attempts=2, base_delay=0.5, max_delay=1),
+        "qa_chat":       RetryPolicy(deadline_seconds=12, max_attempts=3),
+        "submit_answer": RetryPolicy(deadline_seconds=12, max_attempts=3),
+        "submit_answers": RetryPolicy(deadline_seconds=20, max_attempts=3),
+        "generate_quiz": RetryPolicy(deadline_seconds=15, max_attempts=3),
+        "clarify_text":  RetryPolicy(deadline_seconds=15, max_attempts=3),
+        "warmup":        RetryPolicy(deadline_seconds=300, max_attempts=8, base_delay=2, max_delay=60,
+                                     wait_for_limiter=True),
+    }.items()
+}
+
+def gemini_retry_policy(route):
+    return GEMINI_RETRY_POLICIES.get(route, GEMINI_RETRY_POLICIES["default"])
+
+GEMINI_RATE_LIMITED = "Error: Gemini API rate limited. Please try again in a few minutes."
 
 #helper fnc to call gemini
-def call_gemini(prompt, temperature=0.3, max_retries=3):
+def call_gemini(prompt, temperature=0.3, route="default", cache=True, policy=None, json_mode=False):
     """
     Helper function to call Gemini API with retry logic
     
     Args:
         prompt: The text prompt to send to Gemini
         temperature: Controls randomness (0-1). Lower = more focused
-        max_retries: Maximum number of retries on rate limit (429)
+        route: Name used for per-route cache hit ratios (and LLM_CACHE_OPT_OUT) and the retry policy
+        cache: Set False to always generate a fresh answer
+        policy: RetryPolicy to use instead of the route's
+        json_mode: Ask Gemini for a JSON response (response_mime_type=application/json)
     
     Returns:
         The text response from Gemini
     """
-    import time
+    policy = policy or gemini_retry_policy(route)
+    if not cache or route in LLM_CACHE_OPT_OUT:
+        return _call_gemini_uncached(prompt, temperature, policy, json_mode)
+
+    key = gemini_cache_key(prompt, temperature, json_mode)
+    cached = llm_cache.get(key)
+    llm_cache.record(route, cached is not None)
+    if cached is not None:
+        return cached
+
+    def generate():
+        text = _call_gemini_uncached(prompt, temperature, policy, json_mode)
+        if not text.startswith("Error:"):
+            llm_cache.put(key, text)
+        return text
+
+    # identical prompts already in flight (a whole class opening the same story) share one call;
+    # joining someone else's call still only waits as long as this route's own deadline
+    try:
+        return GEMINI_FLIGHT.do(key, generate, timeout=policy.deadline_seconds)
+    except WaitTimeout as e:
+        print(f"{e} ({route}, {policy.deadline_seconds:.0f}s deadline)")
+        return GEMINI_RATE_LIMITED
+
+def _call_gemini_uncached(prompt, temperature, policy, json_mode=False):
     from google.api_core.exceptions import ResourceExhausted
     
-    for attempt in range(max_retries):
+    budget = policy.start()
+    while True:
         try:
-            if not gemini_rate_limiter.is_allowed():
-                wait_time = 1  # Wait 1 second before retrying
-                print(f"Rate limiter active. Waiting {wait_time}s before retry...")
-                time.sleep(wait_time)
-                continue
+            # waiting for a limiter token comes out of the same deadline, but isn't an upstream attempt
+            rate_limit.acquire("gemini", timeout=budget.limiter_timeout(rate_limit.MAX_WAIT_SECONDS))
 
             response = gemini_model.generate_content(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=temperature,
-                )
+                    response_mime_type="application/json" if json_mode else None,
+                ),
+                request_options={"timeout": max(1.0, budget.remaining())},
             )
             return response.text
+        except RateLimited as e:
+            print(f"Local rate limit: {e}")
+            return GEMINI_RATE_LIMITED
         except ResourceExhausted as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt  # exponential backoff: 1s, 2s, 4s
-                print(f"Rate limited. Waiting {wait_time}s before retry {attempt + 1}/{max_retries}...")
-                time.sleep(wait_time)
-            else:
-                print(f"Max retries exceeded. Returning error message.")
-                return f"Error: Gemini API rate limited. Please try again in a few minutes."
+            delay = budget.next_delay(retry_after_hint(e))
+            if delay is None:
+                print(f"Gemini still rate limited after {budget.attempts} attempt(s); giving up before the deadline.")
+                return GEMINI_RATE_LIMITED
+            print(f"Rate limited. Waiting {delay:.1f}s before retry {budget.attempts + 1}/{policy.max_attempts}...")
+            time.sleep(delay)
         except Exception as e:
             print(f"Error calling Gemini: {e}")
             raise
 
+def stream_gemini(prompt, temperature=0.3, route="default", cache=True, policy=None):
+    """
+    Streaming twin of call_gemini: returns (deltas, cached), where deltas yields the answer
+    text as Gemini generates it. A cache hit yields the whole answer at once; rate limiting
+    yields GEMINI_RATE_LIMITED as the only delta, like call_gemini returns it.
+    """
+    policy = policy or gemini_retry_policy(route)
+    if not cache or route in LLM_CACHE_OPT_OUT:
+        return _stream_gemini_uncached(prompt, temperature, policy), False
+
+    key = gemini_cache_key(prompt, temperature)
+    cached = llm_cache.get(key)
+    llm_cache.record(route, cached is not None)
+    if cached is not None:
+        return iter([cached]), True
+
+    def store(deltas):
+        text = "".join(deltas)
+        if text and not text.startswith("Error:"):
+            llm_cache.put(key, text)
+
+    # shares the cache with call_gemini; identical streams in flight replay one upstream stream,
+    # which is pumped to the end (and cached) even if the client that started it goes away
+    deltas = GEMINI_STREAM_FLIGHT.stream(
+        key, lambda: _stream_gemini_uncached(prompt, temperature, policy), on_complete=store
+    )
+    return deltas, False
+
+def _stream_gemini_uncached(prompt, temperature, policy):
+    from google.api_core.exceptions import ResourceExhausted
+
+    budget = policy.start()
+    while True:
+        sent_text = False
+        try:
+            rate_limit.acquire("gemini", timeout=budget.limiter_timeout(rate_limit.MAX_WAIT_SECONDS))
+
+            response = gemini_model.generate_content(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=temperature,
+                ),
+                request_options={"timeout": max(1.0, budget.remaining())},
+                stream=True,
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    continue  # chunk without text parts (finish reason / usage only)
+                if text:
+                    sent_text = True
+                    yield text
+            return
+        except RateLimited as e:
+            print(f"Local rate limit: {e}")
+            yield GEMINI_RATE_LIMITED
+            return
+        except ResourceExhausted as e:
+            if sent_text:
+                raise  # the client already has part of this answer, a retry would repeat it
+            delay = budget.next_delay(retry_after_hint(e))
+            if delay is None:
+                print(f"Gemini still rate limited after {budget.attempts} attempt(s); giving up before the deadline.")
+                yield GEMINI_RATE_LIMITED
+                return
+            print(f"Rate limited. Waiting {delay:.1f}s before retry {budget.attempts + 1}/{policy.max_attempts}...")
+            time.sleep(delay)
+
+def stream_completion(route, prompt, finish=lambda text: text):
+    """
+    SSE response for a streamed completion: a `delta` event per chunk of text, a `sentence`
+    event per completed sentence (so the client can start reading it aloud), then `done` with
+    the full text (passed through finish). The first delta is pulled before responding, so a
+    rate limit or upstream error still comes back as a JSON error with a real status code.
+    """
+    started = time.monotonic()
+    try:
+        deltas, cached = stream_gemini(prompt, temperature=0.3, route=route)
+    except Saturated as e:
+        print(f"[⚠️ {route}] {e}")
+        STREAM_TIMINGS.count(route, "busy")
+        resp = jsonify({"error": "Too many requests. Please wait a moment and try again."})
+        resp.headers["Retry-After"] = str(STREAM_BUSY_RETRY_SECONDS)
+        return resp, 429
+    try:
+        first = next(deltas, "")
+    except Exception as e:
+        traceback.print_exc()
+        STREAM_TIMINGS.count(route, "errors")
+        return jsonify({"error": str(e)}), 500
+    if first.startswith("Error:"):
+        STREAM_TIMINGS.count(route, "errors")
+        return jsonify({"error": first}), 429
+
+    ttft = time.monotonic() - started
+    STREAM_TIMINGS.count(route, "cache_hits" if cached else "streams")
+    if not cached:
+        STREAM_TIMINGS.add(route, "ttft", ttft)
+
+    def generate():
+        parts = []
+        splitter = SentenceSplitter()
+        sentences = 0
+        try:
+            for delta in itertools.chain([first], deltas):
+                if not delta:
+                    continue
+                parts.append(delta)
+                yield sse_event("delta", {"text": delta})
+                for sentence in splitter.feed(delta):
+                    yield sse_event("sentence", {"index": sentences, "text": sentence})
+                    sentences += 1
+            for sentence in splitter.finish():
+                yield sse_event("sentence", {"index": sentences, "text": sentence})
+            if not cached:
+                STREAM_TIMINGS.add(route, "total", time.monotonic() - started)
+            yield sse_event("done", {"text": finish("".join(parts)), "ttft_ms": round(ttft * 1000), "cached": cached})
+        except Exception as e:
+            traceback.print_exc()
+            STREAM_TIMINGS.count(route, "errors")
+            yield sse_event("error", {"error": str(e)})
+
+    resp = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return resp
+
 @app.route("/api/save-questionnaire", methods=["POST"])
 def save_questionnaire():
     try:
@@ -192,19 +422,11 @@ def save_questionnaire():
         if not answers:
             return jsonify({"error": "answers are required"}), 400
 
-        # Create authenticated Supabase client if access_token is provided
+        # Shared connection pool; only the Authorization header is per request
+        client_to_use = pooled_rest.rest(access_token)
         if access_token:
-            from supabase import create_client
-            auth_supabase = create_client(
-                os.getenv("SUPABASE_URL"),
-                os.getenv("SUPABASE_KEY")
-            )
-            # Set the auth header for this request
-            auth_supabase.postgrest.auth(access_token)
-            client_to_use = auth_supabase
             print("[🔐 Using authenticated Supabase client]")
         else:
-            client_to_use = supabase
             print("[⚠️ Using anonymous Supabase client - RLS may block this]")
 
         # Save to Supabase
@@ -226,14 +448,12 @@ def save_questionnaire():
         }
 
         response = client_to_use.table("profiles").upsert(profile_data).execute()
+        profile_cache.invalidate(user_id)
 
         print("[✅ Saved to Supabase]", response.data)
 
         # Still save to JSON for backward compatibility (optional)
-        profile = _load_profile()
-        profile["questionnaire"] = answers
-        _save_profile(profile)
-        shutil.copy("profile.json", "../frontend/public/profile.json")
+        profile_store.update(lambda profile: {**profile, "questionnaire": answers})
 
         return jsonify({"msg": "questionnaire stored"})
 
@@ -255,30 +475,15 @@ def get_profile():
         if not user_id:
             return jsonify({"error": "user_id is required"}), 400
 
-        # Create authenticated Supabase client if access_token is provided
-        if access_token:
-            from supabase import create_client
-            auth_supabase = create_client(
-                os.getenv("SUPABASE_URL"),
-                os.getenv("SUPABASE_KEY")
-            )
-            # Set the auth header for this request
-            auth_supabase.postgrest.auth(access_token)
-            client_to_use = auth_supabase
-            print("[🔐 Using authenticated Supabase client]")
-        else:
-            client_to_use = supabase
+        if not access_token:
             print("[⚠️ Using anonymous Supabase client - RLS may block this]")
 
-        # Get from Supabase
-        response = client_to_use.table("profiles").select("*").eq("id", user_id).execute()
+        # Get from Supabase (cached per user until the questionnaire is saved again)
+        profile = profile_cache.get(user_id, access_token, lambda: _fetch_profile(user_id, access_token))
 
-        print(f"[🔍 Supabase response] data: {response.data}, count: {len(response.data) if response.data else 0}")
-
-        if response.data and len(response.data) > 0:
-            print(f"[✅ Loaded profile from Supabase] User: {user_id}")
-            print(f"[📦 Profile data] {response.data[0]}")
-            return jsonify(response.data[0])
+        if profile:
+            print(f"[✅ Loaded profile] User: {user_id}")
+            return jsonify(profile)
         else:
             # No profile found in database, return empty
             print(f"[ℹ️ No profile found for user: {user_id}]")
@@ -368,10 +573,34 @@ def login():
         return jsonify({"error": "Invalid email or password"}), 401
 
 #helper to turn saved questionnaire into short context string
-def _profile_context() -> str:
+_legacy_context = {}  # profile.json fallback, re-rendered only when the file changes
+
+def _profile_context(user_id=None, access_token=None) -> str:
+    """
+    Learner context for prompts: the requesting user's (cached) Supabase profile,
+    or the legacy profile.json when the caller doesn't say who they are.
+    """
+    if user_id:
+        try:
+            return profile_cache.context(
+                user_id, access_token,
+                lambda: _fetch_profile(user_id, access_token),
+                lambda profile: _render_profile_context((profile or {}).get("questionnaire") or {}),
+            )
+        except Exception as e:
+            print(f"[⚠️ Could not load profile for {user_id}] {e}")
+            return ""
+    try:
+        mtime = os.path.getmtime(PROFILE_PATH)
+    except OSError:
+        mtime = None
+    if _legacy_context.get("mtime") != mtime:
+        _legacy_context["context"] = _render_profile_context(_load_profile().get("questionnaire", {}))
+        _legacy_context["mtime"] = mtime
+    return _legacy_context["context"]
+
+def _render_profile_context(q) -> str:
     """Return a compact, human-readable summary of the questionnaire."""
-    profile = _load_profile()
-    q = profile.get("questionnaire", {})
     if not q:
         return ""                       # nothing yet
 
@@ -412,8 +641,118 @@ def home():
 def hello():
     return "👋 Hello!"
 
+# -----------------------------------------
+# story warm-up: after an upload, precompute what each child's session would
+# otherwise wait on (segmentation, quiz, sentence audio).
+# LLM calls go through call_gemini and audio through synthesize_google_tts, so
+# the normal routes hit the same caches; the artifacts are also stored as JSON.
+STORY_WARMUP_DEFAULT = os.getenv("STORY_WARMUP", "off").lower()
+STORY_WARMUP_TTS = os.getenv("STORY_WARMUP_TTS", "on").lower() in {"on", "true", "1", "yes"}
+#warm-up audio covers the opening of the story (what's read first); the rest is synthesized on demand
+STORY_WARMUP_TTS_MAX_SENTENCES = int(os.getenv("STORY_WARMUP_TTS_MAX_SENTENCES", "40"))
+#warm-up waits as long as it needs for its own "tts_warmup" tokens; it's not in a hurry
+STORY_WARMUP_TTS_WAIT_SECONDS = float(os.getenv("STORY_WARMUP_TTS_WAIT_SECONDS", "300"))
+ARTIFACTS_PATH = os.path.join(STORY_STORAGE_PATH, "artifacts")
+os.makedirs(ARTIFACTS_PATH, exist_ok=True)
+WARMUP_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("STORY_WARMUP_WORKERS", "1")), thread_name_prefix="warmup")
+#ids queued or running in this process; checked and claimed under the lock so re-uploads can't double-submit
+_warmups_pending = set()
+_warmups_lock = threading.Lock()
+
+def warmup_requested():
+    """Form field/query param "warmup" overrides the STORY_WARMUP env default."""
+    val = request.values.get("warmup", STORY_WARMUP_DEFAULT)
+    return str(val).lower() in {"on", "true", "1", "yes"}
+
+def _artifacts_file(artifact_id):
+    # ids are uuids or hex digests; refuse anything that could escape the folder
+    if not artifact_id or not re.fullmatch(r"[A-Za-z0-9-]+", artifact_id):
+        return None
+    return os.path.join(ARTIFACTS_PATH, f"{artifact_id}.json")
+
+def load_story_artifacts(artifact_id):
+    path = _artifacts_file(artifact_id)
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _save_story_artifacts(artifact_id, artifacts):
+    path = _artifacts_file(artifact_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(artifacts, f)
+    os.replace(tmp, path)  # readers never see a half-written file
+
+def warm_up_story(artifact_id, raw_text):
+    """Background job; each step is best-effort so one failure doesn't lose the rest."""
+    title, paragraphs = segment_story_text(raw_text)
+    artifacts = {"id": artifact_id, "status": "running", "title": title, "paragraphs": paragraphs}
+    _save_story_artifacts(artifact_id, artifacts)
+    print(f"[🔥 Warm-up] {artifact_id}: {len(paragraphs)} paragraphs")
+
+    try:
+        # same prompt generate_quiz builds, so its call_gemini hits this answer in the llm cache
+        raw = call_gemini(quiz_prompt(raw_text[:1500]), temperature = 0.3, route="warmup")
+        if not raw.startswith("Error:"):
+            artifacts["questions"] = parse_quiz_questions(raw)
+    except Exception as e:
+        print(f"[⚠️ Warm-up quiz failed] {e}")
+    _save_story_artifacts(artifact_id, artifacts)
+
+    if STORY_WARMUP_TTS:
+        audio = []
+        sentences = [(p_index, sentence) for p_index, paragraph in enumerate(paragraphs)
+                     for sentence in split_sentences(paragraph)]
+        for p_index, sentence in sentences[:STORY_WARMUP_TTS_MAX_SENTENCES]:
+            try:
+                audio_id, _ = synthesize_google_tts(sentence[:1000], warmup=True)
+                audio.append({"paragraph": p_index, "text": sentence, "audio_id": audio_id, "url": f"/api/tts/audio/{audio_id}"})
+            except Exception as e:
+                print(f"[⚠️ Warm-up TTS failed] {e}")
+        artifacts["audio"] = audio
+
+    artifacts["status"] = "done"
+    _save_story_artifacts(artifact_id, artifacts)
+    print(f"[✅ Warm-up done] {artifact_id}")
+
+def schedule_story_warmup(artifact_id, raw_text):
+    with _warmups_lock:
+        if artifact_id in _warmups_pending:
+            return  # same story already queued or warming
+        existing = load_story_artifacts(artifact_id)
+        if existing and existing.get("status") in {"queued", "running", "done"}:
+            return
+        _warmups_pending.add(artifact_id)
+        _save_story_artifacts(artifact_id, {"id": artifact_id, "status": "queued"})
+    WARMUP_EXECUTOR.submit(_run_story_warmup, artifact_id, raw_text)
+
+def _run_story_warmup(artifact_id, raw_text):
+    try:
+        warm_up_story(artifact_id, raw_text)
+    except Exception as e:
+        print(f"[⚠️ Warm-up failed] {artifact_id}: {e}")
+    finally:
+        with _warmups_lock:
+            _warmups_pending.discard(artifact_id)
+
+@app.route('/api/story-artifacts/<artifact_id>', methods=['GET'])
+def story_artifacts(artifact_id):
+    artifacts = load_story_artifacts(artifact_id)
+    if artifacts is None:
+        return jsonify({'error': 'Artifacts not found'}), 404
+    return jsonify(artifacts)
+
+def _wants_ndjson():
+    return request.args.get("stream") in {"1", "true", "on"} or "application/x-ndjson" in request.headers.get("Accept", "")
+
 @app.route('/api/upload-pdf', methods=['POST'])
 def upload_pdf():
+    """
+    Returns {"text", "title", "paragraphs", "page_spans", "page_count"} once the whole PDF is parsed, or with
+    ?stream=1 (or Accept: application/x-ndjson) NDJSON lines as pages finish:
+    {"type": "page", "page", "text", "title", "paragraphs"} ... then {"type": "done", "text", "title", ...}
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
 
@@ -422,66 +761,75 @@ def upload_pdf():
     if not file.filename.endswith('.pdf'):
         return jsonify({'error': 'Invalid file format'}), 400
 
-    # Save temporarily
-    filepath = os.path.join('temp', file.filename)
-    os.makedirs('temp', exist_ok=True)
-    file.save(filepath)
-
+    # parsed straight from memory (no temp/<filename> to collide on between users)
+    pdf_bytes = file.read()
     try:
-        doc = fitz.open(filepath)
-        raw_text = "\n".join([page.get_text() for page in doc])
-        doc.close()
-        os.remove(filepath)
-
-        # Split lines, extract title
-        lines = [line.strip() for line in raw_text.strip().splitlines() if line.strip()]
-        title = lines[0] if lines else "Untitled"
-        combined = "\n".join(lines[1:]) if len(lines) > 1 else ""
-
-        # Split paragraphs (double newlines or quotes)
-        raw_paragraphs = re.split(r'\n\s*\n|(?=\n["“])', combined)
+        check_pdf_size(pdf_bytes)
+    except PDFTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    warmup = warmup_requested()
+
+    def finish(result):
+        if warmup:
+            # keyed on the text, so re-uploads of the same story share one warm-up
+            artifact_id = cache_key("story", result["text"])[:32]
+            schedule_story_warmup(artifact_id, result["text"])
+            result["artifact_id"] = artifact_id
+        return result
+
+    if _wants_ndjson():
+        def generate():
+            try:
+                segmenter = StorySegmenter()
+                page_texts = []
+                number = 0
+                for number, page_text in iter_pdf_pages(pdf_bytes):
+                    page_texts.append(page_text)
+                    paragraphs = segmenter.feed(page_text, page=number)
+                    yield json.dumps({"type": "page", "page": number, "text": page_text,
+                                      "title": segmenter.title, "paragraphs": paragraphs}) + "\n"
+                tail = segmenter.finish()
+                if tail:
+                    yield json.dumps({"type": "page", "page": number, "title": segmenter.title, "paragraphs": tail}) + "\n"
+                # built from the pages already streamed (same fields build_result would give)
+                result = finish({
+                    "type": "done",
+                    "text": "\n".join(page_texts),
+                    "title": segmenter.title or "Untitled",
+                    "page_spans": [list(span) for span in segmenter.spans],
+                    "page_count": len(page_texts),
+                })
+                yield json.dumps(result) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        return Response(generate(), mimetype="application/x-ndjson")
 
-        # Replace inner line breaks with space to fix weird splits like "With\na smile"
-        paragraphs = [
-            re.sub(r"\s*\n\s*", " ", p).strip()
-            for p in raw_paragraphs if p.strip()
-        ]
-
-        # Replace all internal newlines with spaces before splitting
-        cleaned_text = combined.replace("\n", " ")
-
-        # Naively split paragraphs by sentence breaks for now
-        # can improve this later using NLP or by detecting longer pauses
-        raw_paragraphs = re.split(r'(?<=[.?!])\s+(?=[A-Z“"])', cleaned_text)
-
-        paragraphs = [p.strip() for p in raw_paragraphs if p.strip()]
-
-        print("[PARAGRAPHS]", paragraphs)
-
-        return jsonify({
-            "text": raw_text,
-            "title": title,
-            "paragraphs": paragraphs
+    try:
+        extracted = extract_pdf(pdf_bytes)
+        result = finish({
+            "text": extracted["text"],
+            "title": extracted["title"],
+            "paragraphs": extracted["paragraphs"],
+            "page_spans": extracted["page_spans"],
+            "page_count": extracted["page_count"],
         })
-
+        print("[PARAGRAPHS]", len(result["paragraphs"]))
+        return jsonify(result)
+
+    except PDFTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except PDFParseTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except PDFParseFailed as e:
+        return jsonify({'error': str(e)}), 422
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 
-#generating quiz questions
-@app.route('/api/generate-quiz', methods=['POST'])
-def generate_quiz():
-    # Rate limiting check
-    if not gemini_rate_limiter.is_allowed():
-        return jsonify({
-            "error": "Too many requests. Gemini API rate limit (10 per minute). Please wait a moment and try again."
-        }), 429
-    
-    data = request.get_json()
-    story = data.get("text", "")[:1500]
-
-    q_prompt = f"""
+#quiz prompt/parsing shared by generate_quiz and the story warm-up
+def quiz_prompt(story):
+    return f"""
 You are a reading tutor for kids aged 7–10.
 
 Below is a story. Your job is to create 3 simple, clear reading comprehension questions for the child.
@@ -497,33 +845,167 @@ Output ONLY the 3 questions, numbered:
 2. ...
 3. ...
 """
-    raw = call_gemini(q_prompt, temperature = 0.3)
+
+def parse_quiz_questions(raw):
+    return [line.strip().split(". ", 1)[-1]
+            for line in raw.strip().split("\n")
+            if line.strip() and line.strip()[0].isdigit()]
+
+#generating quiz questions
+@app.route('/api/generate-quiz', methods=['POST'])
+def generate_quiz():
+    data = request.get_json()
+
+    # precomputed at upload time?
+    artifacts = load_story_artifacts(data.get("artifact_id"))
+    if artifacts and artifacts.get("questions"):
+        return jsonify({"questions": artifacts["questions"]})
+
+    story = data.get("text", "")[:1500]
+
+    raw = call_gemini(quiz_prompt(story), temperature = 0.3, route="generate_quiz")
     
     # Check if we got an error message
     if "Error:" in raw:
         return jsonify({"error": raw}), 429
 
-    questions = [line.strip().split(". ", 1)[-1]
-                 for line in raw.strip().split("\n")
-                 if line.strip() and line.strip()[0].isdigit()]
+    questions = parse_quiz_questions(raw)
 
     return jsonify({"questions": questions})
 
 #submiting answer
 @app.route('/api/submit-answer', methods=['POST'])
 def submit_answer():
-    # Rate limiting check
-    if not gemini_rate_limiter.is_allowed():
-        return jsonify({
-            "error": "Too many requests. Gemini API rate limit (10 per minute). Please wait a moment and try again."
-        }), 429
-    
     data = request.get_json()
     story = data.get("text", "")[:1500]
     question = data.get("question", "")
     answer = data.get("answer", "")
 
-    fb_prompt = f"""
+    feedback = call_gemini(feedback_prompt(story, question, answer), temperature = 0.3, route="submit_answer")
+    
+    # Check if we got an error message
+    if "Error:" in feedback:
+        return jsonify({"error": feedback}), 429
+
+    return jsonify({"feedback": feedback})
+
+#grading a whole quiz at once: one gemini call (one story copy, one limiter slot) for every answer
+SUBMIT_ANSWERS_MAX = int(os.getenv("SUBMIT_ANSWERS_MAX", "10"))
+
+@app.route('/api/submit-answers', methods=['POST'])
+def submit_answers():
+    """
+    JSON body:
+    {
+      "text": "story...",
+      "items": [{"question": "Who found the key?", "answer": "Sam"}, ...]
+    }
+    Returns {"results": [{"feedback": "...", "correct": true, "source": "batch"}, ...]} in item
+    order. Items missing from the model's JSON are graded one at a time ("source": "single").
+    """
+    data = request.get_json()
+    story = data.get("text", "")[:1500]
+    items = data.get("items")
+
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "items must be a non-empty list of {question, answer}"}), 400
+    if len(items) > SUBMIT_ANSWERS_MAX:
+        return jsonify({"error": f"At most {SUBMIT_ANSWERS_MAX} items per request"}), 400
+
+    pairs = [(str(item.get("question", "")), str(item.get("answer", ""))) for item in items]
+
+    raw = call_gemini(batch_feedback_prompt(story, pairs), temperature = 0.3, route="submit_answers", json_mode=True)
+
+    # a rate-limited batch would only get worse split into per-item calls
+    if "Error:" in raw:
+        return jsonify({"error": raw}), 429
+
+    graded = parse_batch_feedback(raw, len(pairs))
+    if len(graded) < len(pairs):
+        print(f"⚠️ Batch grading parsed {len(graded)}/{len(pairs)} items; grading the rest one at a time")
+
+    results = []
+    for index, (question, answer) in enumerate(pairs):
+        if index in graded:
+            results.append({**graded[index], "source": "batch"})
+            continue
+        feedback = call_gemini(feedback_prompt(story, question, answer), temperature = 0.3, route="submit_answer")
+        if "Error:" in feedback:
+            results.append({"error": feedback, "source": "single"})
+        else:
+            results.append({"feedback": feedback, "correct": None, "source": "single"})
+
+    return jsonify({"results": results})
+
+def batch_feedback_prompt(story, pairs):
+    numbered = "\n".join(
+        f"{i}. Question: {question}\n   Student Answer: {answer}"
+        for i, (question, answer) in enumerate(pairs, start=1)
+    )
+    return f"""
+You are a friendly reading tutor for kids aged 7–10.
+
+Below is a story excerpt and a numbered list of questions about the story, each with a student's answer.
+For every question, give kind, simple feedback using **only** the story info.
+
+✅ If the answer is correct, say so and explain why using story phrases.
+❌ If not, gently explain the correct answer based on the story.
+
+🚫 DO NOT invent names, characters, or facts.
+
+Story:
+\"\"\"{story}\"\"\" 
+
+{numbered}
+
+Respond with only a JSON array, one object per question, in the same order:
+[{{"index": 1, "correct": true, "feedback": "..."}}]
+"""
+
+def parse_batch_feedback(raw, count):
+    """{item index: {"feedback", "correct"}} for every item the model's JSON answered usably."""
+    content = raw.strip()
+    if content.startswith("```"):
+        content = content.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return {}
+    if isinstance(data, dict):
+        data = data.get("results") or data.get("feedback") or []
+    if not isinstance(data, list):
+        return {}
+
+    graded = {}
+    for position, entry in enumerate(data):
+        if not isinstance(entry, dict):
+            continue
+        feedback = entry.get("feedback")
+        if not isinstance(feedback, str) or not feedback.strip():
+            continue
+        index = entry.get("index", position + 1)
+        if isinstance(index, str) and index.isdigit():
+            index = int(index)
+        if not isinstance(index, int) or not 1 <= index <= count or index - 1 in graded:
+            continue
+        correct = entry.get("correct")
+        graded[index - 1] = {
+            "feedback": feedback.strip(),
+            "correct": correct if isinstance(correct, bool) else None,
+        }
+    return graded
+
+#same as /api/submit-answer, but the feedback streams in as server-sent events
+@app.route('/api/submit-answer/stream', methods=['POST'])
+def submit_answer_stream():
+    data = request.get_json()
+    story = data.get("text", "")[:1500]
+    prompt = feedback_prompt(story, data.get("question", ""), data.get("answer", ""))
+    return stream_completion("submit_answer", prompt)
+
+#prompt builders shared with the async app (asgi_app.py)
+def feedback_prompt(story, question, answer):
+    return f"""
 You are a friendly reading tutor for kids aged 7–10.
 
 Below is a story excerpt, a question about the story, and a student's answer.
@@ -540,14 +1022,6 @@ Question: {question}
 Student Answer: {answer}
 """
 
-    feedback = call_gemini(fb_prompt, temperature = 0.3)
-    
-    # Check if we got an error message
-    if "Error:" in feedback:
-        return jsonify({"error": feedback}), 429
-
-    return jsonify({"feedback": feedback})
-
 #helper function to send message to local websocket server -- commented out since for matcha
 # async def send_tts_message(text):
 #     uri = "ws://localhost:1000"
@@ -562,6 +1036,66 @@ Student Answer: {answer}
 #         return response
 
 
+#helper to synthesize one clip with google cloud tts (cached)
+def synthesize_google_tts(text, voice_name="en-US-Wavenet-F", speaking_rate=1.0, pitch=0.0, warmup=False):
+    """
+    Returns (audio_id, mp3_bytes). audio_id is the content-addressed cache key,
+    so the same sentence always maps to the same id (and ETag).
+    warmup=True paces the call on the capped "tts_warmup" bucket as well as "tts".
+    """
+    key = tts_cache_key(text, voice_name, speaking_rate, pitch, "MP3")
+    cached = tts_cache.get(key)
+    if cached is not None:
+        return key, cached
+
+    if warmup:
+        # wait for the warm-up share before joining the flight, so a child's request for the
+        # same sentence never sits behind the warm-up's pacing
+        rate_limit.acquire("tts_warmup", timeout=STORY_WARMUP_TTS_WAIT_SECONDS)
+
+    def synthesize():
+        rate_limit.acquire("tts")
+        response = tts_client.synthesize_speech(**google_tts_request(text, voice_name, speaking_rate, pitch))
+        tts_cache.put(key, response.audio_content)
+        return response.audio_content
+
+    return key, TTS_FLIGHT.do(key, synthesize)
+
+def google_tts_request(text, voice_name, speaking_rate, pitch):
+    """synthesize_speech kwargs (shared by the sync and async clients)."""
+    synthesis_input = texttospeech.SynthesisInput(text=text)
+
+    voice = texttospeech.VoiceSelectionParams(
+        language_code="en-US",
+        ssml_gender=texttospeech.SsmlVoiceGender.FEMALE,
+        name=voice_name
+    )
+
+    audio_config = texttospeech.AudioConfig(
+        audio_encoding=texttospeech.AudioEncoding.MP3,
+        speaking_rate=speaking_rate,
+        pitch=pitch
+    )
+    return {"input": synthesis_input, "voice": voice, "audio_config": audio_config}
+
+def _audio_mimetype(audio: bytes) -> str:
+    return "audio/wav" if audio[:4] == b"RIFF" else "audio/mpeg"
+
+#serve audio straight from memory; conditional=True gives Range + If-None-Match handling
+def send_audio(audio_id: str, audio: bytes):
+    mimetype = _audio_mimetype(audio)
+    resp = send_file(
+        io.BytesIO(audio),
+        mimetype=mimetype,
+        as_attachment=False,
+        download_name="tts.wav" if mimetype == "audio/wav" else "tts.mp3",
+        conditional=True,
+        etag=audio_id,
+        max_age=31536000,  # content-addressed, so it never changes
+    )
+    resp.headers["X-Audio-Id"] = audio_id
+    return resp
+
 #new matcha-tts clarity tags (replaced with google cloud tts)
 @app.route('/api/tts', methods=['POST'])
 def tts():
@@ -570,38 +1104,83 @@ def tts():
     print("🔊 Google TTS receives:", text)
 
     try:
-        synthesis_input = texttospeech.SynthesisInput(text=text)
-
-        voice = texttospeech.VoiceSelectionParams(
-            language_code="en-US",
-            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE,
-            name="en-US-Wavenet-F"  #specific voice option, we can change this around
-        )
-
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=1.0,
-            pitch=0.0
-        )
-
-        response = tts_client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
-        )
-
-        output_path = os.path.join("temp", "tts_output.mp3")
-        os.makedirs("temp", exist_ok=True)
-        with open(output_path, "wb") as out:
-            out.write(response.audio_content)
-
-        print(f"✅ Audio saved at {output_path}")
-        return send_file(output_path, mimetype="audio/mpeg", as_attachment=False)
+        audio_id, audio = synthesize_google_tts(text)
+        return send_audio(audio_id, audio)
 
+    except RateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+#batch tts: one request per page instead of one per sentence
+TTS_BATCH_WORKERS = int(os.getenv("TTS_BATCH_WORKERS", "4"))
+TTS_BATCH_MAX = int(os.getenv("TTS_BATCH_MAX", "100"))
+# shared across requests so the total number of in-flight google calls stays bounded
+TTS_BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=TTS_BATCH_WORKERS, thread_name_prefix="tts-batch")
+
+def _batch_item(index, future, include_audio):
+    """Resolve one sentence; a failure becomes an error entry instead of sinking the batch."""
+    try:
+        audio_id, audio = future.result()
+    except Exception as e:
+        print(f"❌ Batch TTS failed for sentence {index}: {e}")
+        return {"index": index, "error": str(e)}
+    item = {
+        "index": index,
+        "audio_id": audio_id,
+        "url": f"/api/tts/audio/{audio_id}",
+        "mimetype": _audio_mimetype(audio),
+        "bytes": len(audio),
+    }
+    if include_audio:
+        item["audio"] = base64.b64encode(audio).decode("ascii")
+    return item
+
+@app.route('/api/tts/batch', methods=['POST'])
+def tts_batch():
+    """
+    JSON body:
+    {
+      "sentences": ["First sentence.", "Second sentence."],
+      "stream": false
+    }
+    Returns a manifest of per-sentence audio ids (fetch via /api/tts/audio/<id>),
+    or with "stream": true (or Accept: application/x-ndjson) one NDJSON line per
+    sentence, in order, each carrying its base64 audio as soon as it is ready.
+    """
+    data = request.get_json(force=True) or {}
+    sentences = data.get("sentences")
+    if not isinstance(sentences, list) or not sentences:
+        return jsonify({"error": "'sentences' must be a non-empty list"}), 400
+    if len(sentences) > TTS_BATCH_MAX:
+        return jsonify({"error": f"At most {TTS_BATCH_MAX} sentences per batch"}), 400
+
+    futures = [
+        TTS_BATCH_EXECUTOR.submit(synthesize_google_tts, str(sentence or "")[:1000])
+        for sentence in sentences
+    ]
+
+    stream = bool(data.get("stream")) or "application/x-ndjson" in request.headers.get("Accept", "")
+    if stream:
+        def generate():
+            # iterate in submission order: later clips may already be done, but order is kept
+            for index, future in enumerate(futures):
+                yield json.dumps(_batch_item(index, future, include_audio=True)) + "\n"
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    clips = [_batch_item(index, future, include_audio=False) for index, future in enumerate(futures)]
+    failed = sum(1 for clip in clips if "error" in clip)
+    return jsonify({"clips": clips, "count": len(clips), "failed": failed})
+
+#GET by id so <audio> elements can seek (Range) and revalidate (If-None-Match) without re-synthesis
+@app.route('/api/tts/audio/<audio_id>', methods=['GET'])
+def tts_audio(audio_id):
+    audio = tts_cache.get(audio_id)
+    if audio is None:
+        return jsonify({"error": "Audio not found"}), 404
+    return send_audio(audio_id, audio)
+
 
 #clarify text for matcha-tts
 @app.route('/api/clarify-text', methods=['POST'])
@@ -620,7 +1199,7 @@ def clarify_text():
         "Return only the revised text with !word! tags. Do not explain or comment. Do NOT start with phrases like 'Here is the revised text'"
     )
 
-    clarified_text = call_gemini(clarity_prompt, temperature = 0.3).strip()
+    clarified_text = call_gemini(clarity_prompt, temperature = 0.3, route="clarify_text").strip()
 
     # Clean up unexpected bold or double !! if present
     #sometimes the model might return text with **bold** or !!double exclamations!!
@@ -642,6 +1221,24 @@ def clarify_text():
 #    return jsonify({'transcription': transcription})
 
 #google cloud stt
+def stt_config():
+    # MediaRecorder output from the browser
+    return speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
+        sample_rate_hertz=48000,
+        language_code="en-US",
+        enable_automatic_punctuation=True,
+    )
+
+def transcript_from(response):
+    transcription = ""
+    if response.results:
+        for result in response.results:
+            if result.alternatives:
+                transcription += result.alternatives[0].transcript + " "
+        transcription = transcription.strip()
+    return transcription or "No speech detected"
+
 @app.route('/api/transcribe-audio', methods=['POST'])
 def transcribe_audio():
     try:
@@ -655,37 +1252,83 @@ def transcribe_audio():
         audio_content = file.read()
         print(f"📊 Audio file size: {len(audio_content)} bytes")
         
-        # Configure recognition
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
-            sample_rate_hertz=48000,
-            language_code="en-US",
-            enable_automatic_punctuation=True,
-        )
-        
         audio = speech.RecognitionAudio(content=audio_content)
         
         print("🔄 Sending to Google Speech-to-Text")
-        response = stt_client.recognize(config=config, audio=audio)
+        rate_limit.acquire("stt")
+        response = stt_client.recognize(config=stt_config(), audio=audio)
         
-        transcription = ""
-        if response.results:
-            for result in response.results:
-                if result.alternatives:
-                    transcription += result.alternatives[0].transcript + " "
-            transcription = transcription.strip()
-        
-        if not transcription:
-            transcription = "No speech detected"
+        transcription = transcript_from(response)
             
         print(f"✅ Transcription: {transcription}")
         return jsonify({'transcription': transcription})
 
+    except RateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         print("❌ STT Error:")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+#streaming google cloud stt: audio is recognized while it is still uploading
+#(the one-shot route above stays for short clips; recognize caps out around 1 minute)
+STT_STREAM_CHUNK_BYTES = int(os.getenv("STT_STREAM_CHUNK_BYTES", str(16 * 1024)))
+# streaming_recognize sessions are limited to ~5 minutes of audio
+STT_STREAM_MAX_SECONDS = float(os.getenv("STT_STREAM_MAX_SECONDS", "280"))
+
+@app.route('/api/transcribe-audio/stream', methods=['POST'])
+def transcribe_audio_stream():
+    """
+    Body: raw WebM/Opus audio, sent with chunked transfer encoding as it is recorded
+    (not multipart). Responds with NDJSON as results arrive:
+    {"type": "interim", "transcript"} / {"type": "final", "transcript"} ... {"type": "done", "transcription"}
+    """
+    try:
+        rate_limit.acquire("stt")  # one session = one request against the quota
+    except RateLimited as e:
+        return rate_limited_response(e)
+
+    streaming_config = speech.StreamingRecognitionConfig(config=stt_config(), interim_results=True)
+    body = request.stream  # read from grpc's request thread, outside the request proxy
+
+    def audio_requests():
+        started = time.monotonic()
+        received = 0
+        while time.monotonic() - started < STT_STREAM_MAX_SECONDS:
+            chunk = body.read(STT_STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            received += len(chunk)
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+        print(f"📊 Streamed {received} audio bytes")
+
+    def generate():
+        finals = []
+        try:
+            print("🔄 Streaming to Google Speech-to-Text")
+            responses = stt_client.streaming_recognize(config=streaming_config, requests=audio_requests())
+            for response in responses:
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    transcript = result.alternatives[0].transcript.strip()
+                    if result.is_final:
+                        finals.append(transcript)
+                        yield json.dumps({"type": "final", "transcript": transcript}) + "\n"
+                    else:
+                        yield json.dumps({"type": "interim", "transcript": transcript}) + "\n"
+            transcription = " ".join(t for t in finals if t) or "No speech detected"
+            print(f"✅ Transcription: {transcription}")
+            yield json.dumps({"type": "done", "transcription": transcription}) + "\n"
+        except Exception as e:
+            print("❌ STT Stream Error:")
+            traceback.print_exc()
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    # X-Accel-Buffering: stop nginx holding interim results until the end
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+
 #qa assistant .tsx page
 # Free-form QA assistant based on uploaded story
 @app.route('/api/qa-chat', methods=['POST'])
@@ -695,9 +1338,22 @@ def qa_chat():
     user_question = data.get("question", "")
 
     #pull user context 
-    learner_ctx = _profile_context()
+    learner_ctx = _profile_context(data.get("user_id"), data.get("access_token"))
 
-    chat_prompt = f"""
+    answer = call_gemini(qa_prompt(story, user_question, learner_ctx), temperature = 0.3, route="qa_chat")
+    
+
+    return jsonify({"answer": answer})
+
+@app.route('/api/qa-chat/stream', methods=['POST'])
+def qa_chat_stream():
+    data = request.get_json()
+    story = data.get("text", "")[:1500]
+    learner_ctx = _profile_context(data.get("user_id"), data.get("access_token"))
+    return stream_completion("qa_chat", qa_prompt(story, data.get("question", ""), learner_ctx))
+
+def qa_prompt(story, user_question, learner_ctx):
+    return f"""
 You are an assistant that answers reading-comprehension questions for children aged 7-10.
 Use only the information from the provided story. Do not summarize the story if the user asks.
 If the user asks to summarize, politely decline and say you can only answer questions about the story.
@@ -718,10 +1374,6 @@ Question: {user_question}
 
 Answer:
 """
-    answer = call_gemini(chat_prompt, temperature = 0.3)
-    
-
-    return jsonify({"answer": answer})
 
 #api call for definition feature on extracted text page
 @app.route("/api/define", methods=["POST"])
@@ -733,7 +1385,23 @@ def define_word():
     if not word:
         return jsonify({"error": "No word provided"}), 400
 
-    prompt = f"""
+    result = call_gemini(define_prompt(story, word), temperature = 0.3, route="define_word")
+
+    return jsonify({"definition": result.strip()})
+
+@app.route("/api/define/stream", methods=["POST"])
+def define_word_stream():
+    data = request.get_json()
+    story = data.get("text", "")[:1500]
+    word = data.get("word", "").strip()
+
+    if not word:
+        return jsonify({"error": "No word provided"}), 400
+
+    return stream_completion("define_word", define_prompt(story, word), finish=str.strip)
+
+def define_prompt(story, word):
+    return f"""
 You are a friendly English tutor for children aged 7–10.
 
 Below is a story and a word that appears in it. Explain what the word means in the context of the story, using simple language that a child would understand.
@@ -752,9 +1420,6 @@ Your job:
 Answer:
 
 """
-    result = call_gemini(prompt, temperature = 0.3)
-
-    return jsonify({"definition": result.strip()})
 
 # route for calling gemini tts
 @app.route("/api/tts-gemini", methods=["POST"])
@@ -763,9 +1428,11 @@ def tts_gemini():
     JSON body:
     {
       "text": "Say cheerfully: Have a wonderful day!",
-      "voice": "Erinome"
+      "voice": "Erinome",
+      "stream": true
     }
-    Returns: audio/wav file bytes
+    Returns: audio/wav bytes. On a cache miss the WAV is streamed (chunked) as
+    PCM arrives from the model; "stream": false waits for the complete file.
     """
     try:
         data = request.get_json(force=True) or {}
@@ -775,20 +1442,61 @@ def tts_gemini():
         if not text:
             return jsonify({"error": "Missing 'text'"}), 400
 
-        wav_bytes = tts_service.synthesize_tts(text, voice)
-
-        return send_file(
-            io.BytesIO(wav_bytes),
-            mimetype="audio/wav",
-            as_attachment=False,
-            download_name="tts.wav",
+        # gemini tts has no rate/pitch knobs; sample rate + container stand in for them
+        key = tts_cache_key(text, voice, None, None, "WAV-24000")
+        wav_bytes = tts_cache.get(key)
+        if wav_bytes is not None:
+            print("✅ Gemini TTS cache hit")
+            return send_audio(key, wav_bytes)
+
+        if data.get("stream", True) is False:
+            def synthesize():
+                wav = tts_service.synthesize_tts(text, voice)
+                tts_cache.put(key, wav)
+                return wav
+            return send_audio(key, GEMINI_TTS_FLIGHT.do(key, synthesize))
+
+        # concurrent requests for the same clip replay one upstream stream; it's pumped in the
+        # background, and only a complete clip is cached (chunks[0] is the streaming header)
+        chunks = GEMINI_TTS_FLIGHT.stream(
+            key,
+            lambda: tts_service.synthesize_tts_stream(text, voice),
+            on_complete=lambda parts: tts_cache.put(key, tts_service.pcm_to_wav(b"".join(parts[1:]))),
         )
+        header = next(chunks)  # raises here (-> 500 JSON) if the upstream call fails
+
+        def relay():
+            yield header
+            yield from chunks
 
+        resp = Response(relay(), mimetype="audio/wav")
+        resp.headers["X-Audio-Id"] = key
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
+    except RateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
+#counters for sizing the caches against real classroom traffic
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "tts_cache": tts_cache.stats(),
+        **image_cache_stats(),
+        "rate_limits": rate_limit.stats(),
+        "llm_cache": llm_cache.stats(),
+        "pdf_cache": pdf_extract.cache_stats(),
+        "pdf_pool": pdf_extract.pool_stats(),
+        "profile_cache": profile_cache.stats(),
+        "singleflight": singleflight.stats(),
+        "llm_streams": STREAM_TIMINGS.stats(),
+        "gemini_retry_policies": {name: policy.describe() for name, policy in GEMINI_RETRY_POLICIES.items()},
+    })
+
 #route for logging to flask focus
 @app.route('/api/log-focus', methods=['POST'])
 def log_focus():
@@ -806,7 +1514,13 @@ def upload_story():
     story_id = str(uuid.uuid4())
     filename = f"{story_id}.pdf"
     filepath = os.path.join(STORY_STORAGE_PATH, filename)
-    file.save(filepath)
+    pdf_bytes = file.read()
+    try:
+        check_pdf_size(pdf_bytes)
+    except PDFTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    with open(filepath, 'wb') as f:
+        f.write(pdf_bytes)
     pdf_url = f"/api/download-story-pdf/{story_id}"
     created_at = datetime.utcnow().isoformat()
     # Insert into Supabase/Postgres
@@ -822,35 +1536,48 @@ def upload_story():
         'cover_url': '',
         'created_at': created_at
     }
-    meta_path = os.path.join(STORY_STORAGE_PATH, f"{story_id}.json")
-    with open(meta_path, "w") as f:
-        import json
-        json.dump(meta, f)
+    # parsing here also primes the extraction cache for reading/illustrating this story later
+    try:
+        extracted = extract_pdf(pdf_bytes)
+        meta['page_count'] = extracted['page_count']
+    except Exception as e:
+        print(f"[⚠️ Could not parse story PDF] {story_id}: {e}")
+        extracted = None
+    if extracted and warmup_requested():
+        meta['artifact_id'] = story_id
+        schedule_story_warmup(story_id, extracted['text'])
+    story_store.add(meta)
     return jsonify({'success': True, 'story': meta})
 
 @app.route('/api/user-stories', methods=['GET'])
 def user_stories():
+    """
+    Query params: userId, limit (optional, max 500; without it every story is returned), offset,
+    sort ("created_at" | "title"), order ("desc" | "asc")
+    """
     user_id = request.args.get('userId')
-    stories = []
-    for fname in os.listdir(STORY_STORAGE_PATH):
-        if fname.endswith('.json'):
-            with open(os.path.join(STORY_STORAGE_PATH, fname)) as f:
-                import json
-                meta = json.load(f)
-                if meta.get('user_id') == user_id:
-                    stories.append(meta)
-    return jsonify({'stories': stories})
+    try:
+        limit = request.args.get('limit')
+        limit = min(max(int(limit), 1), 500) if limit is not None else None
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    sort = request.args.get('sort', 'created_at')
+    descending = request.args.get('order', 'desc').lower() != 'asc'
+
+    stories, total = story_store.list_for_user(user_id, limit=limit, offset=offset, sort=sort, descending=descending)
+    return jsonify({'stories': stories, 'total': total, 'limit': limit, 'offset': offset})
 
 @app.route('/api/story-details', methods=['GET'])
 def story_details():
     story_id = request.args.get('storyId')
-    meta_path = os.path.join(STORY_STORAGE_PATH, f"{story_id}.json")
-    if not os.path.exists(meta_path):
+    meta = story_store.get(story_id)
+    if meta is None:
         return jsonify({'error': 'Story not found'}), 404
-    with open(meta_path) as f:
-        import json
-        meta = json.load(f)
     # For demo, just return metadata. You can add text extraction, images, etc.
+    artifacts = load_story_artifacts(meta.get('artifact_id'))
+    if artifacts:
+        meta['artifacts'] = artifacts
     return jsonify(meta)
 
 @app.route('/api/download-story-pdf/<story_id>', methods=['GET'])
@@ -860,6 +1587,34 @@ def download_story_pdf(story_id):
         return "File not found", 404
     return send_file(filepath, as_attachment=True)
 
+def startup():
+    """
+    Process setup: upstream clients, the one-shot story migration and illustration job recovery.
+    Runs when the app is imported (gunicorn, asgi_app) or run with `python app.py`, but not in
+    spawned PDF pool workers: they re-import the launching script as __mp_main__ and only need
+    pdf_extract, so they mustn't build clients or pick up queued image jobs.
+    """
+    global gemini_model, tts_client, stt_client
+
+    #configure gemini api key
+    genai.configure(api_key = os.getenv("GOOGLE_API_KEY"))
+    gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+    #initialize google tts + stt clients
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("GOOGLE_TTS_CREDENTIALS_PATH")
+    tts_client = texttospeech.TextToSpeechClient()
+    stt_client = speech.SpeechClient()
+
+    migrated = story_store.migrate_json_dir(STORY_STORAGE_PATH)
+    if migrated:
+        print(f"[📚 Migrated {migrated} story metadata file(s) into the story store]")
+
+    # resume jobs left behind by a previous run (claims are atomic, so multiple workers are fine)
+    recover_jobs()
+
+if __name__ != "__mp_main__":
+    startup()
+
 if __name__ == "__main__":
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False) #allows to run external connections (for deployment)
\ No newline at end of file
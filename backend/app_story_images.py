@@ -2,55 +2,83 @@ from __future__ import annotations
 import os
 import io
 import base64
+import hashlib
 import json
 import time
-from datetime import datetime
 from urllib.parse import urljoin
 from flask import url_for
 from pathlib import Path
 from typing import List, Tuple
 
-from flask import Flask, request, jsonify, Blueprint, send_from_directory
-import fitz  # PyMuPDF
+from flask import Flask, request, jsonify, Blueprint, send_from_directory, Response, stream_with_context
 from openai import OpenAI
 import google.generativeai as genai  # Add Gemini API
 from dotenv import load_dotenv
 from uuid import uuid4
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from job_store import make_job_store
+from blob_cache import build_cache, cache_key, DiskLRU, MemoryLRU, TieredCache
+from pdf_extract import extract_pdf, check_pdf_size, PDFTooLarge, PDFParseTimeout, PDFParseFailed
+import rate_limit
+from singleflight import SingleFlight
 # blueprint
 images_bp = Blueprint('images_bp', __name__)
 
 load_dotenv()
 
-# in-memory job store
-JOBS: dict[str, dict] = {}
+# job store (sqlite by default, see job_store.py) + config
+JOB_STORE = make_job_store()
+# worker threads per process running illustration jobs
+IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "2"))
+# queued + running jobs allowed before /images/story/async answers 429
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "20"))
+# finished jobs are dropped after this many seconds
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+# running jobs with no progress for this long are considered orphaned
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "1800"))
+# SSE: how often the stream checks the store, and how long one connection lives
+# each open stream holds a server thread, so connections are kept short and the
+# browser reconnects with Last-Event-ID (see gunicorn.conf.py for the thread count)
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "0.5"))
+SSE_MAX_SECONDS = int(os.getenv("SSE_MAX_SECONDS", "60"))
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "1000"))
 # thread pool for bg work
-EXECUTOR = ThreadPoolExecutor(max_workers=2)
+EXECUTOR = ThreadPoolExecutor(max_workers=IMAGE_JOB_WORKERS)
 
 # progress fcn
-def log_progress(job_id: str | None, message: str) -> None:
-    """Append a human-readable progress message to a job, if it exists."""
+def log_progress(job_id: str | None, message: str, kind: str = "progress", data: dict | None = None) -> None:
+    """Append a human-readable progress message (or a typed event, e.g. kind="image") to a job."""
     if not job_id:
         return
-    job = JOBS.get(job_id)
-    if job is None:
-        return
-    job.setdefault("progress", [])
-    job["progress"].append(message)
+    JOB_STORE.append_progress(job_id, message, kind=kind, data=data)
     print(f"[JOB {job_id}] {message}")
 
 # bg worker fcn 
-def run_image_job(job_id: str, pdf_bytes: bytes, form_data: dict, base_url: str = "http://localhost:5000") -> None:
-    """Background worker: run process_story_images and store result in JOBS."""
-    JOBS[job_id]["status"] = "running"
+def run_image_job(job_id: str) -> None:
+    """Background worker: claim a queued job, run process_story_images and store the result."""
+    inputs = JOB_STORE.claim(job_id)
+    if inputs is None:
+        return  # another worker got it first (or it expired)
+    pdf_bytes, form_data, base_url = inputs
     try:
-        result = process_story_images(pdf_bytes, form_data, job_id=job_id, base_url=base_url)
-        JOBS[job_id]["status"] = "done"
-        JOBS[job_id]["result"] = result
+        result = process_story_images(pdf_bytes, form_data, job_id=job_id, base_url=base_url or "http://localhost:5000")
+        JOB_STORE.finish(job_id, result=result)
     except Exception as e:
-        JOBS[job_id]["status"] = "error"
-        JOBS[job_id]["error"] = str(e)
         log_progress(job_id, f"Error: {e}")
+        JOB_STORE.finish(job_id, error=str(e))
+
+def recover_jobs() -> None:
+    """On startup (app.startup()): drop expired jobs, re-queue orphaned running ones, resume the queue."""
+    try:
+        JOB_STORE.purge_expired(JOB_TTL_SECONDS)
+        queued = JOB_STORE.recover(JOB_STALE_SECONDS)
+    except Exception as e:
+        print(f"[JOBS] Recovery failed: {e}")
+        return
+    for job_id in queued:
+        EXECUTOR.submit(run_image_job, job_id)
+    if queued:
+        print(f"[JOBS] Resumed {len(queued)} queued job(s)")
 
 # --------
 # config
@@ -75,6 +103,49 @@ if DEFAULT_SIZE not in ALLOWED_SIZES:
 # Image model for generation
 IMAGE_MODEL = os.getenv("IMAGE_MODEL", "gpt-image-1")
 
+# Results reference images by URL; each PNG is stored once, named by its sha256
+HASHED_DIR = OUTPUT_DIR / "by-hash"
+# "on" restores inline base64 data URLs in results (offline demos)
+INLINE_IMAGES_DEFAULT = os.getenv("INLINE_IMAGES", "off").lower()
+
+# Illustration cache (see blob_cache.py), LRU-evicted by total size:
+# - story summaries keyed on the PDF bytes + options that shape the summary
+# - PNGs keyed on their sha256, stored in OUTPUT_DIR/by-hash (the same files the image URLs serve)
+# - an index from final prompt + size + IMAGE_MODEL to that sha256, under OUTPUT_DIR/cache
+CACHE_DIR = OUTPUT_DIR / "cache"
+SUMMARY_CACHE = build_cache(
+    CACHE_DIR / "summaries",
+    memory_mb=float(os.getenv("SUMMARY_CACHE_MEMORY_MB", "4")),
+    disk_mb=float(os.getenv("SUMMARY_CACHE_DISK_MB", "32")),
+    suffix=".json",
+)
+IMAGE_CACHE = TieredCache(
+    MemoryLRU(int(float(os.getenv("IMAGE_CACHE_MEMORY_MB", "64")) * 1024 * 1024)),
+    DiskLRU(HASHED_DIR, int(float(os.getenv("IMAGE_CACHE_DISK_MB", "1024")) * 1024 * 1024), suffix=".png"),
+)
+IMAGE_INDEX = build_cache(
+    CACHE_DIR / "image_index",
+    memory_mb=1,
+    disk_mb=float(os.getenv("IMAGE_INDEX_DISK_MB", "8")),
+    suffix=".sha256",
+)
+# concurrent identical generations (same cache key) collapse into one OpenAI call
+IMAGE_FLIGHT = SingleFlight(
+    "image",
+    max_waiters=int(os.getenv("SINGLEFLIGHT_MAX_WAITERS", "100")),
+    wait_timeout=float(os.getenv("IMAGE_SINGLEFLIGHT_WAIT_SECONDS", "300")),
+)
+
+# Max seconds an image call waits for a rate-limit token (see rate_limit.py)
+IMAGE_RATE_WAIT_SECONDS = float(os.getenv("IMAGE_RATE_WAIT", "120"))
+
+# Scene images generated concurrently: per job (overridable with the "concurrency"
+# form field) and across all jobs in this process
+IMAGE_JOB_CONCURRENCY = int(os.getenv("IMAGE_JOB_CONCURRENCY", "2"))
+IMAGE_GLOBAL_CONCURRENCY = int(os.getenv("IMAGE_GLOBAL_CONCURRENCY", "4"))
+# the pool size is the global cap
+SCENE_EXECUTOR = ThreadPoolExecutor(max_workers=IMAGE_GLOBAL_CONCURRENCY, thread_name_prefix="scene")
+
 # LLM model for story summarization // planning
 SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gemini-1.5-flash")  # Changed to use Gemini
 # ---------------------------
@@ -97,13 +168,8 @@ def get_gemini_client():
 
 # PDF → Text
 def pdf_bytes_to_pages(pdf_bytes: bytes) -> List[str]:
-    """Extract plain text per page from a PDF file (bytes)."""
-    pages: List[str] = []
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        for page in doc:
-            text = page.get_text("text").strip()
-            pages.append(text if text else "")  # Keep page count consistent
-    return pages
+    """Extract plain text per page from a PDF file (bytes), shared with app.py via pdf_extract."""
+    return [text.strip() for text in extract_pdf(pdf_bytes)["pages"]]  # Keep page count consistent
 
 # story summarizer helper
 def summarize_story_pages(
@@ -147,6 +213,7 @@ def summarize_story_pages(
     )
 
     try:
+        rate_limit.acquire("gemini")
         response = model.generate_content(prompt)
         content = response.text
         
@@ -286,6 +353,8 @@ def build_style_preamble(reader_age: int | None = None) -> str:
 def generate_image(prompt: str, size: str = DEFAULT_SIZE) -> bytes:
     """Calls OpenAI Images API and returns PNG bytes."""
     client = get_openai_client()
+    # jobs run in the background, so they can afford to queue for a token
+    rate_limit.acquire("image", timeout=IMAGE_RATE_WAIT_SECONDS)
     resp = client.images.generate(
         model=IMAGE_MODEL,
         prompt=prompt,
@@ -295,6 +364,68 @@ def generate_image(prompt: str, size: str = DEFAULT_SIZE) -> bytes:
     b64_png = resp.data[0].b64_json  # Base64 encoded PNG
     return base64.b64decode(b64_png)
 
+def _job_concurrency(form_data: dict) -> int:
+    """Per-job scene concurrency, clamped to [1, IMAGE_GLOBAL_CONCURRENCY]."""
+    try:
+        n = int(form_data.get("concurrency", IMAGE_JOB_CONCURRENCY))
+    except (TypeError, ValueError):
+        n = IMAGE_JOB_CONCURRENCY
+    return max(1, min(n, IMAGE_GLOBAL_CONCURRENCY))
+
+def cached_generate_image(prompt: str, size: str = DEFAULT_SIZE) -> bytes:
+    """generate_image, but identical (prompt, size, model) requests are paid for once."""
+    key = cache_key("image", prompt, size, IMAGE_MODEL)
+    digest = IMAGE_INDEX.get(key)
+    png_bytes = IMAGE_CACHE.get(digest.decode()) if digest is not None else None
+    if png_bytes is None:
+        # two jobs for the same story in flight at once share one generation
+        png_bytes = IMAGE_FLIGHT.do(key, lambda: _generate_and_cache(key, prompt, size))
+    return png_bytes
+
+def _generate_and_cache(key: str, prompt: str, size: str) -> bytes:
+    png_bytes = generate_image(prompt, size=size)
+    save_png_content_addressed(png_bytes)
+    IMAGE_INDEX.put(key, hashlib.sha256(png_bytes).hexdigest().encode())
+    return png_bytes
+
+def cached_story_summary(pdf_bytes: bytes, pages: List[str], cap: int) -> dict:
+    """summarize_story_pages, cached on a hash of the PDF bytes and max_scene."""
+    key = cache_key("summary", hashlib.sha256(pdf_bytes).hexdigest(), cap, SUMMARY_MODEL)
+    cached = SUMMARY_CACHE.get(key)
+    if cached is not None:
+        return json.loads(cached)
+    summary = summarize_story_pages(pages, max_scene=cap)
+    if summary:  # {} means the LLM call failed - don't pin that
+        SUMMARY_CACHE.put(key, json.dumps(summary).encode("utf-8"))
+    return summary
+
+def cache_stats() -> dict:
+    return {
+        "summary_cache": SUMMARY_CACHE.stats(),
+        "image_cache": IMAGE_CACHE.stats(),
+        "image_index": IMAGE_INDEX.stats(),
+    }
+
+def wants_inline_images(form_data: dict) -> bool:
+    """Opt-in to base64 data URLs (form field "inline_images" or INLINE_IMAGES env)."""
+    val = form_data.get("inline_images", INLINE_IMAGES_DEFAULT)
+    return str(val).lower().strip() in {"on", "true", "1", "yes"}
+
+def save_png_content_addressed(png_bytes: bytes) -> str:
+    """Store PNG once in IMAGE_CACHE as OUTPUT_DIR/by-hash/<sha256>.png; returns the path relative to OUTPUT_DIR."""
+    digest = hashlib.sha256(png_bytes).hexdigest()
+    path = IMAGE_CACHE.disk.path_for(digest)
+    IMAGE_CACHE.memory.put(digest, png_bytes)
+    try:
+        os.utime(path)  # already stored; still in use, so keep it away from eviction
+    except FileNotFoundError:
+        IMAGE_CACHE.disk.put(digest, png_bytes)  # written atomically, so readers never see half a PNG
+    return f"{HASHED_DIR.name}/{path.name}"
+
+def file_url(filename: str, base_url: str) -> str:
+    """Absolute URL for a file served by serve_generated."""
+    return f"{base_url.rstrip('/')}/api/generated/{filename}"
+
 def png_to_data_url(png_bytes: bytes) -> str:
     """Convert PNG bytes to a base64 data URL for inline display."""
     b64 = base64.b64encode(png_bytes).decode('utf-8')
@@ -347,7 +478,7 @@ def process_story_images(pdf_bytes: bytes, form_data: dict, job_id: str | None =
     # for testing time:
     tbeforeSummary = time.monotonic()
     log_progress(job_id, "Summarizing story to extract key scenes")
-    summary = summarize_story_pages(pages, max_scene=cap)
+    summary = cached_story_summary(pdf_bytes, pages, cap)
     tafterSummary = time.monotonic()
     log_progress(job_id, f"Story summary done in {tafterSummary - tbeforeSummary:.1f}s.")
     print(f"Time for story summarization: {tafterSummary - tbeforeSummary:.2f} seconds")
@@ -387,46 +518,76 @@ def process_story_images(pdf_bytes: bytes, form_data: dict, job_id: str | None =
         )
     
     images_json: list[dict] = []
-    log_progress(job_id, f"Generating exactly {cap} illustration(s)…")
+    job_concurrency = _job_concurrency(form_data)
+    log_progress(job_id, f"Generating exactly {cap} illustration(s), {job_concurrency} at a time…")
     
-    # NO RETRIES - each attempt costs credits! Try each scene only once
+    # NO RETRIES - each attempt costs credits! Try each scene only once.
+    # Scenes are launched in order and a new one only starts when
+    # (successes + in flight) < cap, so the scenes that end up illustrated are
+    # the same ones the old sequential loop would have picked.
     counted = 0
-    scene_idx = 0
+    next_scene = 0
     last_error = None
-      # Keep trying different scenes until we get all required images or run out of scenes
-    while counted < cap and scene_idx < len(scenes):
-        scene = scenes[scene_idx]
-        scene_summary = scene.get("summary") or "A key moment from the story."
-        prompt = page_to_prompt(scene_summary, scene_idx, context_preamble)
-        page_num = counted + 1  # Sequential page number
-        
-        try:
-            log_progress(job_id, f"Generating image {page_num}/{cap} from scene {scene_idx + 1}")
+    generated: dict[int, tuple[str, bytes]] = {}  # scene_idx -> (prompt, png)
+    in_flight: dict = {}  # future -> (scene_idx, scene_summary, prompt)
+
+    def launch_more() -> None:
+        nonlocal next_scene
+        while (
+            next_scene < len(scenes)
+            and counted + len(in_flight) < cap
+            and len(in_flight) < job_concurrency
+        ):
+            scene = scenes[next_scene]
+            scene_summary = scene.get("summary") or "A key moment from the story."
+            prompt = page_to_prompt(scene_summary, next_scene, context_preamble)
+            log_progress(job_id, f"Generating image from scene {next_scene + 1}")
             # Log the prompt being used (for debugging)
             log_progress(job_id, f"   Prompt preview: {scene_summary[:80]}...")
-            png_bytes = generate_image(prompt, size=size)
-            
-            # Convert to base64 data URL (no file saving!)
-            data_url = png_to_data_url(png_bytes)
-            
-            images_json.append(
-                {
-                    "url": data_url,  # Base64 data URL
-                    "page": page_num,  # Sequential: 1, 2, 3
-                    "prompt": prompt,
-                }
-            )
-            counted += 1
-            log_progress(job_id, f"✅ Successfully generated image {page_num}/{cap}")
-            scene_idx += 1
-            
-        except Exception as e:
-            last_error = str(e)
-            log_progress(job_id, f"⚠️ Failed to generate image from scene {scene_idx + 1}")
-            log_progress(job_id, f"   Error: {last_error}")
-            log_progress(job_id, f"   Scene text: {scene_summary[:100]}...")
-            log_progress(job_id, f"   Skipping this scene and trying next one...")
-            scene_idx += 1
+            future = SCENE_EXECUTOR.submit(cached_generate_image, prompt, size)
+            in_flight[future] = (next_scene, scene_summary, prompt)
+            next_scene += 1
+
+    inline = wants_inline_images(form_data)
+
+    # Keep trying different scenes until we get all required images or run out of scenes
+    launch_more()
+    while in_flight:
+        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        for future in done:
+            scene_idx, scene_summary, prompt = in_flight.pop(future)
+            try:
+                png_bytes = future.result()
+                generated[scene_idx] = (prompt, png_bytes)
+                counted += 1
+                log_progress(job_id, f"✅ Successfully generated image {counted}/{cap} (scene {scene_idx + 1})")
+                # per-image event for SSE clients; final page numbers arrive with the result
+                image_event = {"scene": scene_idx + 1, "completed": counted, "cap": cap}
+                if not inline:
+                    image_event["url"] = file_url(save_png_content_addressed(png_bytes), base_url)
+                log_progress(job_id, f"Image ready for scene {scene_idx + 1}", kind="image", data=image_event)
+            except Exception as e:
+                last_error = str(e)
+                log_progress(job_id, f"⚠️ Failed to generate image from scene {scene_idx + 1}")
+                log_progress(job_id, f"   Error: {last_error}")
+                log_progress(job_id, f"   Scene text: {scene_summary[:100]}...")
+                log_progress(job_id, f"   Skipping this scene and trying next one...")
+        launch_more()
+
+    # page numbers follow scene order, not completion order
+    for page_num, scene_idx in enumerate(sorted(generated), start=1):
+        prompt, png_bytes = generated[scene_idx]
+        if inline:
+            url = png_to_data_url(png_bytes)  # Base64 data URL, for offline demos
+        else:
+            url = file_url(save_png_content_addressed(png_bytes), base_url)
+        images_json.append(
+            {
+                "url": url,
+                "page": page_num,  # Sequential: 1, 2, 3
+                "prompt": prompt,
+            }
+        )
       # If we generated at least 1 image, return it (even if fewer than requested)
     if counted == 0:
         raise RuntimeError(
@@ -470,6 +631,12 @@ def create_story_images():
         # Get base URL from request context for image serving
         base_url = f"{request.scheme}://{request.host}"
         result = process_story_images(pdf_bytes, request.form.to_dict(), base_url=base_url)
+    except PDFTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except PDFParseTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except PDFParseFailed as e:
+        return jsonify({"error": str(e)}), 422
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -640,6 +807,20 @@ def create_story_images():
 @images_bp.route("/generated/<path:filename>")
 def serve_generated(filename):
     """Serve generated images."""
+    if filename.startswith(f"{HASHED_DIR.name}/"):
+        # content-addressed: the name is the hash, so the bytes can never change
+        digest = Path(filename).stem
+        try:
+            os.utime(IMAGE_CACHE.disk.path_for(digest))  # served files count as recently used
+        except (OSError, ValueError):
+            pass
+        resp = send_from_directory(
+            str(OUTPUT_DIR.resolve()), filename, mimetype="image/png",
+            etag=digest, max_age=31536000,
+        )
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
     return send_from_directory(str(OUTPUT_DIR.resolve()), filename, mimetype="image/png")
 
 
@@ -663,27 +844,42 @@ def create_story_images_async():
     except Exception as e:
         return jsonify({"error": f"Failed to read PDF: {e}"}), 400
 
+    try:
+        check_pdf_size(pdf_bytes)  # page count is checked when the job parses it
+    except PDFTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+
     form_data = request.form.to_dict()
     
     # Get base URL from request context for image serving
     base_url = f"{request.scheme}://{request.host}"
 
+    JOB_STORE.purge_expired(JOB_TTL_SECONDS)
+    # backpressure: the count is shared by every worker using the same store
+    if JOB_STORE.active_count() >= JOB_QUEUE_MAX:
+        resp = jsonify({"error": "Too many illustration jobs in progress. Please try again shortly."})
+        resp.headers["Retry-After"] = "30"
+        return resp, 429
+
     job_id = str(uuid4())
-    JOBS[job_id] = {
-        "status": "queued",
-        "created_at": datetime.utcnow().isoformat() + "Z",
-        "progress": [],
-    }
+    JOB_STORE.create(job_id, pdf_bytes, form_data, base_url)
 
     # kick off background work
-    EXECUTOR.submit(run_image_job, job_id, pdf_bytes, form_data, base_url)
+    EXECUTOR.submit(run_image_job, job_id)
 
     return jsonify({"job_id": job_id, "status": "queued"}), 202
 
 
+def _since_param(default: int = 0) -> int:
+    try:
+        return max(0, int(request.args.get("since", default)))
+    except (TypeError, ValueError):
+        return default
+
 @images_bp.route("/images/story/async/<job_id>", methods=["GET"])
 def get_story_images_job(job_id: str):
-    job = JOBS.get(job_id)
+    """Poll a job. Pass ?since=<progress_next from the last poll> to get only new progress."""
+    job = JOB_STORE.get(job_id, since=_since_param())
     if not job:
         return jsonify({"error": "Job not found"}), 404
 
@@ -692,6 +888,7 @@ def get_story_images_job(job_id: str):
         "job_id": job_id,
         "status": job.get("status", "unknown"),
         "progress": job.get("progress", []),
+        "progress_next": job.get("progress_next", 0),
     }
     if "result" in job:
         payload["result"] = job["result"]
@@ -699,3 +896,69 @@ def get_story_images_job(job_id: str):
         payload["error"] = job["error"]
 
     return jsonify(payload), 200
+
+
+def _sse(event: str, data: dict, event_id: int | None = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+@images_bp.route("/images/story/async/<job_id>/events", methods=["GET"])
+def stream_story_images_job(job_id: str):
+    """
+    Server-Sent Events for a job: incremental `progress` events, one `image`
+    event per finished illustration, then a final `result` (or `error`) event.
+    Reconnecting clients resume via Last-Event-ID (or ?since=).
+    """
+    if JOB_STORE.get(job_id, since=1 << 30) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    since = _since_param()
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id) + 1
+
+    def generate():
+        cursor = since
+        started = time.monotonic()
+        last_sent = started
+        yield f"retry: {SSE_RETRY_MS}\n\n"  # reconnect delay after we end the connection
+        while True:
+            for entry in JOB_STORE.events(job_id, since=cursor):
+                data = {"message": entry["message"], **entry.get("data", {})}
+                yield _sse(entry["kind"], data, event_id=entry["seq"])
+                cursor = entry["seq"] + 1
+                last_sent = time.monotonic()
+
+            job = JOB_STORE.get(job_id, since=1 << 30)  # status only, skip the log
+            if job is None:
+                yield _sse("error", {"error": "Job expired"})
+                return
+            if job["status"] in {"done", "error"}:
+                # pick up anything logged between the events() read and the status read, so
+                # images that finished before a failure still reach the client
+                for entry in JOB_STORE.events(job_id, since=cursor):
+                    data = {"message": entry["message"], **entry.get("data", {})}
+                    yield _sse(entry["kind"], data, event_id=entry["seq"])
+                if job["status"] == "done":
+                    yield _sse("result", {"status": "done", "result": job.get("result")})
+                else:
+                    yield _sse("error", {"status": "error", "error": job.get("error")})
+                return
+
+            now = time.monotonic()
+            if now - started > SSE_MAX_SECONDS:
+                return  # EventSource reconnects with Last-Event-ID
+            if now - last_sent > 15:
+                yield ": keep-alive\n\n"
+                last_sent = now
+            time.sleep(SSE_POLL_SECONDS)
+
+    resp = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return resp
+
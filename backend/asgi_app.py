@@ -0,0 +1,370 @@
+# async serving mode
+# the I/O-bound routes (gemini / google cloud / supabase calls) run as coroutines on
+# non-blocking clients, so one worker holds many in-flight requests without a thread
+# each; every other route is the unchanged Flask app, mounted through WSGI
+#
+# async: uvicorn asgi_app:application --host 0.0.0.0 --port 5000 --workers 2
+# sync (unchanged): gunicorn app:app --threads 8
+
+from __future__ import annotations
+import asyncio
+import os
+import re
+import traceback
+from contextlib import asynccontextmanager
+
+import httpx
+from google.api_core.exceptions import ResourceExhausted
+from google.cloud import speech, texttospeech
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+try:
+    from a2wsgi import WSGIMiddleware  # streams Flask responses instead of buffering them
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as sync_app
+import rate_limit
+import tts_service
+from rate_limit import RateLimited
+from retry_policy import retry_after_hint
+from singleflight import AsyncSingleFlight, WaitTimeout
+from supabase_client import SUPABASE_URL, SUPABASE_KEY, SUPABASE_POOL_SIZE, SUPABASE_TIMEOUT
+
+# threads a2wsgi/starlette use for the mounted Flask routes
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "16"))
+
+# per-loop counterparts of app.py's single-flight groups
+GEMINI_FLIGHT = AsyncSingleFlight("gemini_async", sync_app.SINGLEFLIGHT_MAX_WAITERS, sync_app.SINGLEFLIGHT_WAIT_SECONDS)
+TTS_FLIGHT = AsyncSingleFlight("google_tts_async", sync_app.SINGLEFLIGHT_MAX_WAITERS, sync_app.SINGLEFLIGHT_WAIT_SECONDS)
+GEMINI_TTS_FLIGHT = AsyncSingleFlight("gemini_tts_async", sync_app.SINGLEFLIGHT_MAX_WAITERS, sync_app.SINGLEFLIGHT_WAIT_SECONDS)
+
+CORS_ORIGINS = ["http://localhost:5173", "https://readingbuddy.vercel.app", "http://localhost:3000"]
+
+# created inside the running loop (grpc aio clients bind to it)
+clients = {}
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    clients["tts"] = texttospeech.TextToSpeechAsyncClient()
+    clients["stt"] = speech.SpeechAsyncClient()
+    clients["rest"] = httpx.AsyncClient(
+        base_url=f"{(SUPABASE_URL or '').rstrip('/')}/rest/v1",
+        headers={"apikey": SUPABASE_KEY or ""},
+        limits=httpx.Limits(max_connections=SUPABASE_POOL_SIZE, max_keepalive_connections=SUPABASE_POOL_SIZE),
+        timeout=SUPABASE_TIMEOUT,
+    )
+    yield
+    await clients["rest"].aclose()
+
+
+def rate_limited_response(e: RateLimited):
+    return JSONResponse(
+        {"error": "Too many requests. Please wait a moment and try again."},
+        status_code=429,
+        headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+    )
+
+
+async def _json_body(request: Request) -> dict:
+    try:
+        return await request.json() or {}
+    except ValueError:
+        return {}
+
+
+# ---------------------------
+# upstream calls
+# ---------------------------
+
+async def call_gemini_async(prompt, temperature=0.3, route="default", cache=True, policy=None):
+    """call_gemini for the event loop: same cache, rate-limit bucket, retry policy and error strings."""
+    policy = policy or sync_app.gemini_retry_policy(route)
+    if not cache or route in sync_app.LLM_CACHE_OPT_OUT:
+        return await _generate_async(prompt, temperature, policy, None)
+
+    key = sync_app.gemini_cache_key(prompt, temperature)
+    cached = await asyncio.to_thread(sync_app.llm_cache.get, key)
+    sync_app.llm_cache.record(route, cached is not None)
+    if cached is not None:
+        return cached
+    try:
+        return await GEMINI_FLIGHT.do(
+            key, lambda: _generate_async(prompt, temperature, policy, key), timeout=policy.deadline_seconds
+        )
+    except WaitTimeout as e:
+        print(f"{e} ({route}, {policy.deadline_seconds:.0f}s deadline)")
+        return sync_app.GEMINI_RATE_LIMITED
+
+
+async def _generate_async(prompt, temperature, policy, key):
+    budget = policy.start()
+    while True:
+        try:
+            await rate_limit.acquire_async("gemini", timeout=budget.limiter_timeout(rate_limit.MAX_WAIT_SECONDS))
+            response = await sync_app.gemini_model.generate_content_async(
+                prompt,
+                generation_config=sync_app.genai.types.GenerationConfig(temperature=temperature),
+                request_options={"timeout": max(1.0, budget.remaining())},
+            )
+            text = response.text
+            break
+        except RateLimited as e:
+            print(f"Local rate limit: {e}")
+            return sync_app.GEMINI_RATE_LIMITED
+        except ResourceExhausted as e:
+            delay = budget.next_delay(retry_after_hint(e))
+            if delay is None:
+                print(f"Gemini still rate limited after {budget.attempts} attempt(s); giving up before the deadline.")
+                return sync_app.GEMINI_RATE_LIMITED
+            print(f"Rate limited. Waiting {delay:.1f}s before retry {budget.attempts + 1}/{policy.max_attempts}...")
+            await asyncio.sleep(delay)
+
+    if key is not None:
+        await asyncio.to_thread(sync_app.llm_cache.put, key, text)
+    return text
+
+
+async def fetch_profile_async(user_id, access_token):
+    resp = await clients["rest"].get(
+        "/profiles",
+        params={"select": "*", "id": f"eq.{user_id}"},
+        headers={"Authorization": f"Bearer {access_token or SUPABASE_KEY}"},
+    )
+    resp.raise_for_status()
+    rows = resp.json()
+    return rows[0] if rows else None
+
+
+async def profile_context_async(user_id, access_token) -> str:
+    if not user_id:
+        return await asyncio.to_thread(sync_app._profile_context)
+    try:
+        return await sync_app.profile_cache.context_async(
+            user_id, access_token,
+            lambda: fetch_profile_async(user_id, access_token),
+            lambda profile: sync_app._render_profile_context((profile or {}).get("questionnaire") or {}),
+        )
+    except Exception as e:
+        print(f"[⚠️ Could not load profile for {user_id}] {e}")
+        return ""
+
+
+async def synthesize_google_tts_async(text, voice_name="en-US-Wavenet-F", speaking_rate=1.0, pitch=0.0):
+    key = sync_app.tts_cache_key(text, voice_name, speaking_rate, pitch, "MP3")
+    cached = await asyncio.to_thread(sync_app.tts_cache.get, key)
+    if cached is not None:
+        return key, cached
+
+    async def synthesize():
+        await rate_limit.acquire_async("tts")
+        response = await clients["tts"].synthesize_speech(**sync_app.google_tts_request(text, voice_name, speaking_rate, pitch))
+        await asyncio.to_thread(sync_app.tts_cache.put, key, response.audio_content)
+        return response.audio_content
+
+    return key, await TTS_FLIGHT.do(key, synthesize)
+
+
+# ---------------------------
+# responses
+# ---------------------------
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def audio_response(request: Request, audio_id: str, audio: bytes) -> Response:
+    """send_audio equivalent: ETag revalidation and single byte-range requests."""
+    mimetype = sync_app._audio_mimetype(audio)
+    headers = {
+        "ETag": f'"{audio_id}"',
+        "Cache-Control": "public, max-age=31536000",
+        "Accept-Ranges": "bytes",
+        "X-Audio-Id": audio_id,
+    }
+    if audio_id in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    match = _RANGE_RE.match(request.headers.get("range", "").strip())
+    if match and (match.group(1) or match.group(2)):
+        size = len(audio)
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start, end = max(0, size - int(match.group(2))), size - 1
+        if start > end or start >= size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(audio[start:end + 1], status_code=206, media_type=mimetype, headers=headers)
+    return Response(audio, media_type=mimetype, headers=headers)
+
+
+# ---------------------------
+# routes (same paths and payloads as app.py)
+# ---------------------------
+
+async def generate_quiz(request: Request):
+    data = await _json_body(request)
+    artifacts = await asyncio.to_thread(sync_app.load_story_artifacts, data.get("artifact_id"))
+    if artifacts and artifacts.get("questions"):
+        return JSONResponse({"questions": artifacts["questions"]})
+
+    story = data.get("text", "")[:1500]
+    raw = await call_gemini_async(sync_app.quiz_prompt(story), temperature=0.3, route="generate_quiz")
+    if "Error:" in raw:
+        return JSONResponse({"error": raw}, status_code=429)
+    return JSONResponse({"questions": sync_app.parse_quiz_questions(raw)})
+
+
+async def submit_answer(request: Request):
+    data = await _json_body(request)
+    story = data.get("text", "")[:1500]
+    prompt = sync_app.feedback_prompt(story, data.get("question", ""), data.get("answer", ""))
+    feedback = await call_gemini_async(prompt, temperature=0.3, route="submit_answer")
+    if "Error:" in feedback:
+        return JSONResponse({"error": feedback}, status_code=429)
+    return JSONResponse({"feedback": feedback})
+
+
+async def qa_chat(request: Request):
+    data = await _json_body(request)
+    story = data.get("text", "")[:1500]
+    learner_ctx = await profile_context_async(data.get("user_id"), data.get("access_token"))
+    prompt = sync_app.qa_prompt(story, data.get("question", ""), learner_ctx)
+    answer = await call_gemini_async(prompt, temperature=0.3, route="qa_chat")
+    return JSONResponse({"answer": answer})
+
+
+async def define_word(request: Request):
+    data = await _json_body(request)
+    story = data.get("text", "")[:1500]
+    word = data.get("word", "").strip()
+    if not word:
+        return JSONResponse({"error": "No word provided"}, status_code=400)
+    result = await call_gemini_async(sync_app.define_prompt(story, word), temperature=0.3, route="define_word")
+    return JSONResponse({"definition": result.strip()})
+
+
+async def tts(request: Request):
+    data = await _json_body(request)
+    text = data.get("text", "")[:1000]
+    try:
+        audio_id, audio = await synthesize_google_tts_async(text)
+        return audio_response(request, audio_id, audio)
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def tts_gemini(request: Request):
+    try:
+        data = await _json_body(request)
+        text = (data.get("text") or "").strip()
+        voice = (data.get("voice") or "Erinome").strip()
+        if not text:
+            return JSONResponse({"error": "Missing 'text'"}, status_code=400)
+
+        key = sync_app.tts_cache_key(text, voice, None, None, "WAV-24000")
+        wav_bytes = await asyncio.to_thread(sync_app.tts_cache.get, key)
+        if wav_bytes is not None:
+            return audio_response(request, key, wav_bytes)
+
+        if data.get("stream", True) is False:
+            async def synthesize():
+                wav = await tts_service.synthesize_tts_async(text, voice)
+                await asyncio.to_thread(sync_app.tts_cache.put, key, wav)
+                return wav
+            return audio_response(request, key, await GEMINI_TTS_FLIGHT.do(key, synthesize))
+
+        chunks = tts_service.synthesize_tts_stream_async(text, voice)
+        header = await chunks.__anext__()  # upstream failures still become a 500 JSON
+
+        async def relay():
+            pcm_parts = []
+            yield header
+            async for pcm in chunks:
+                pcm_parts.append(pcm)
+                yield pcm
+            await asyncio.to_thread(sync_app.tts_cache.put, key, tts_service.pcm_to_wav(b"".join(pcm_parts)))
+
+        return StreamingResponse(relay(), media_type="audio/wav", headers={"X-Audio-Id": key, "Cache-Control": "no-cache"})
+
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def transcribe_audio(request: Request):
+    try:
+        form = await request.form()
+        upload = form.get("audio")
+        if upload is None or isinstance(upload, str):
+            return JSONResponse({"error": "No audio file provided"}, status_code=400)
+        audio_content = await upload.read()
+
+        await rate_limit.acquire_async("stt")
+        response = await clients["stt"].recognize(
+            config=sync_app.stt_config(),
+            audio=speech.RecognitionAudio(content=audio_content),
+        )
+        return JSONResponse({"transcription": sync_app.transcript_from(response)})
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        print("❌ STT Error:")
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def get_profile(request: Request):
+    user_id = request.query_params.get("user_id")
+    access_token = request.query_params.get("access_token")
+    if not user_id:
+        return JSONResponse({"error": "user_id is required"}, status_code=400)
+    try:
+        profile = await sync_app.profile_cache.get_async(
+            user_id, access_token, lambda: fetch_profile_async(user_id, access_token)
+        )
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+    return JSONResponse(profile or {"questionnaire": {}, "struggles": []})
+
+
+native = Starlette(
+    routes=[
+        Route("/api/generate-quiz", generate_quiz, methods=["POST"]),
+        Route("/api/submit-answer", submit_answer, methods=["POST"]),
+        Route("/api/qa-chat", qa_chat, methods=["POST"]),
+        Route("/api/define", define_word, methods=["POST"]),
+        Route("/api/tts", tts, methods=["POST"]),
+        Route("/api/tts-gemini", tts_gemini, methods=["POST"]),
+        Route("/api/transcribe-audio", transcribe_audio, methods=["POST"]),
+        Route("/api/profile", get_profile, methods=["GET"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+NATIVE_PATHS = {route.path for route in native.routes}
+
+try:
+    flask_asgi = WSGIMiddleware(sync_app.app, workers=WSGI_THREADS)
+except TypeError:  # starlette's WSGIMiddleware has no workers option
+    flask_asgi = WSGIMiddleware(sync_app.app)
+
+
+async def application(scope, receive, send):
+    """Native routes (and lifespan) go to Starlette; everything else to Flask, which keeps its own CORS."""
+    if scope["type"] == "lifespan" or scope.get("path") in NATIVE_PATHS:
+        await native(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -0,0 +1,192 @@
+# content-addressed byte cache: in-memory LRU tier + on-disk tier
+# used by app.py to avoid re-synthesizing the same sentence for every child
+
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+def cache_key(*parts) -> str:
+    """Stable sha256 hex digest over the given parts (order matters)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x1f")  # unit separator so ("ab", "c") != ("a", "bc")
+    return h.hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different inputs share a cache entry."""
+    return " ".join((text or "").split())
+
+
+class MemoryLRU:
+    def __init__(self, max_bytes: int):
+        """
+        LRU dict of bytes values bounded by total byte size.
+        max_bytes: budget for the sum of all cached values (0 disables the tier)
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return  # would evict everything and still not fit
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class DiskLRU:
+    def __init__(self, directory: str | os.PathLike, max_bytes: int, suffix: str = ".bin"):
+        """
+        Directory of <key><suffix> files bounded by total size.
+        Recency is tracked with the file mtime, so it survives restarts and is
+        shared by every process pointing at the same directory.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.size = sum(p.stat().st_size for p in self._files())
+
+    def _files(self):
+        return self.directory.glob(f"*{self.suffix}")
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> bytes | None:
+        path = self.path_for(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # bump recency
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        path = self.path_for(key)
+        # write-then-rename so a concurrent reader never sees a partial file
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(value)
+        os.replace(tmp, path)
+        with self._lock:
+            self.size += len(value)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # rescan: other processes may have added/removed files since we last looked
+        entries = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._files())
+
+
+class TieredCache:
+    def __init__(self, memory: MemoryLRU, disk: DiskLRU | None = None):
+        """Memory tier in front of an optional disk tier, with hit/miss counters."""
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)  # promote
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes) -> None:
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_evictions": self.memory.evictions,
+            "disk_evictions": self.disk.evictions if self.disk is not None else 0,
+            "memory_bytes": self.memory.size,
+            "memory_entries": len(self.memory),
+            "memory_max_bytes": self.memory.max_bytes,
+            "disk_bytes": self.disk.size if self.disk is not None else 0,
+            "disk_max_bytes": self.disk.max_bytes if self.disk is not None else 0,
+        }
+
+
+def build_cache(directory: str | os.PathLike | None, memory_mb: float, disk_mb: float, suffix: str = ".bin") -> TieredCache:
+    """Helper for env-driven config: disk_mb <= 0 or no directory disables the disk tier."""
+    memory = MemoryLRU(int(memory_mb * 1024 * 1024))
+    disk = None
+    if directory and disk_mb > 0:
+        disk = DiskLRU(directory, int(disk_mb * 1024 * 1024), suffix=suffix)
+    return TieredCache(memory, disk)
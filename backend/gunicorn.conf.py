@@ -0,0 +1,12 @@
+# gunicorn config, picked up automatically by `gunicorn app:app` when run from backend/
+# threaded workers: SSE streams (illustration job events, /stream completions) and chunked
+# TTS/STT responses each hold a thread for their whole lifetime, and with the default
+# single sync worker one open stream would block every other request
+
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+# gthread heartbeats from its main thread, so this only bounds a hung worker, not long streams
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
@@ -0,0 +1,369 @@
+# pluggable job store for story illustration jobs
+# sqlite by default so jobs survive restarts and are visible to every gunicorn worker
+
+from __future__ import annotations
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+# statuses: queued -> running -> done | error
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "error")
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True  # exists but not ours (or platform can't tell) - assume alive
+    return True
+
+
+def _owner_is_dead(owner: str | None) -> bool:
+    """True if the owner was a process on this host that no longer exists."""
+    if not owner or ":" not in owner:
+        return True
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return False
+    try:
+        return not _pid_alive(int(pid))
+    except ValueError:
+        return True
+
+
+class JobStore(ABC):
+    """
+    Interface for job stores. A job dict looks like:
+    {"status", "created_at", "progress": [str], "progress_next": int, "result"?, "error"?}
+    Progress is an append-only event log; "since" is an index into it, so
+    clients can fetch only entries they haven't seen.
+    """
+
+    @abstractmethod
+    def create(self, job_id: str, pdf_bytes: bytes, form_data: dict, base_url: str) -> dict:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str, since: int = 0) -> dict | None:
+        ...
+
+    @abstractmethod
+    def events(self, job_id: str, since: int = 0) -> list[dict]:
+        """Log entries from index `since` on: [{"seq", "kind", "message", "data"?}]."""
+
+    @abstractmethod
+    def claim(self, job_id: str) -> tuple[bytes, dict, str] | None:
+        """Atomically move a queued job to running; returns its inputs, or None if someone else has it."""
+
+    @abstractmethod
+    def append_progress(self, job_id: str, message: str, kind: str = "progress", data: dict | None = None) -> None:
+        ...
+
+    @abstractmethod
+    def finish(self, job_id: str, result: dict | None = None, error: str | None = None) -> None:
+        ...
+
+    @abstractmethod
+    def active_count(self) -> int:
+        """Number of queued + running jobs (used for backpressure)."""
+
+    @abstractmethod
+    def purge_expired(self, ttl_seconds: float) -> int:
+        """Drop finished jobs older than ttl_seconds; returns how many were removed."""
+
+    @abstractmethod
+    def recover(self, stale_seconds: float) -> list[str]:
+        """Re-queue running jobs whose worker died; returns ids of every queued job."""
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store (no persistence); handy for single-process dev runs."""
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, pdf_bytes, form_data, base_url):
+        job = {
+            "status": "queued",
+            "created_at": _now_iso(),
+            "progress": [],
+            "_inputs": (pdf_bytes, dict(form_data), base_url),
+            "_updated": time.time(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        return {"status": job["status"], "created_at": job["created_at"], "progress": []}
+
+    def get(self, job_id, since=0):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            out = {k: v for k, v in job.items() if not k.startswith("_")}
+            out["progress"] = [e["message"] for e in job["progress"][since:] if e["kind"] == "progress"]
+            out["progress_next"] = len(job["progress"])  # last seq + 1, whatever `since` was
+            return out
+
+    def events(self, job_id, since=0):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return [dict(e) for e in job["progress"][since:]] if job is not None else []
+
+    def claim(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return None
+            job["status"] = "running"
+            job["_updated"] = time.time()
+            return job["_inputs"]
+
+    def append_progress(self, job_id, message, kind="progress", data=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                entry = {"seq": len(job["progress"]), "kind": kind, "message": message}
+                if data is not None:
+                    entry["data"] = data
+                job["progress"].append(entry)
+                job["_updated"] = time.time()
+
+    def finish(self, job_id, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = "error" if error is not None else "done"
+            if result is not None:
+                job["result"] = result
+            if error is not None:
+                job["error"] = error
+            job["_inputs"] = None  # release the pdf bytes
+            job["_updated"] = time.time()
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j["status"] in ACTIVE_STATUSES)
+
+    def purge_expired(self, ttl_seconds):
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, j in self._jobs.items()
+                if j["status"] in FINISHED_STATUSES and j["_updated"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def recover(self, stale_seconds):
+        return []  # nothing survives a restart
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs, inputs and progress in one sqlite file shared by all local workers."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id      TEXT PRIMARY KEY,
+        status      TEXT NOT NULL,
+        created_at  TEXT NOT NULL,
+        updated_at  REAL NOT NULL,
+        owner       TEXT,
+        pdf         BLOB,
+        form_data   TEXT,
+        base_url    TEXT,
+        result      TEXT,
+        error       TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, updated_at);
+    CREATE TABLE IF NOT EXISTS job_progress (
+        job_id  TEXT NOT NULL,
+        seq     INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        kind    TEXT NOT NULL DEFAULT 'progress',
+        data    TEXT,
+        PRIMARY KEY (job_id, seq)
+    );
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = str(path)
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        # older job dbs predate event kinds
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(job_progress)")}
+        if "kind" not in columns:
+            conn.execute("ALTER TABLE job_progress ADD COLUMN kind TEXT NOT NULL DEFAULT 'progress'")
+        if "data" not in columns:
+            conn.execute("ALTER TABLE job_progress ADD COLUMN data TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; sqlite connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id, pdf_bytes, form_data, base_url):
+        created_at = _now_iso()
+        self._conn().execute(
+            "INSERT INTO jobs (job_id, status, created_at, updated_at, pdf, form_data, base_url) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, created_at, time.time(), sqlite3.Binary(pdf_bytes), json.dumps(form_data), base_url),
+        )
+        return {"status": "queued", "created_at": created_at, "progress": []}
+
+    def get(self, job_id, since=0):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT status, created_at, result, error FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, created_at, result, error = row
+        events = self.events(job_id, since)
+        progress = [e["message"] for e in events if e["kind"] == "progress"]
+        if events:
+            progress_next = events[-1]["seq"] + 1
+        else:
+            # nothing new: point at the end of the log, not at a cursor that may be past it
+            (last_seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM job_progress WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            progress_next = last_seq + 1
+        job = {"status": status, "created_at": created_at, "progress": progress, "progress_next": progress_next}
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+    def events(self, job_id, since=0):
+        out = []
+        for seq, kind, message, data in self._conn().execute(
+            "SELECT seq, kind, message, data FROM job_progress WHERE job_id = ? AND seq >= ? ORDER BY seq",
+            (job_id, since),
+        ):
+            entry = {"seq": seq, "kind": kind, "message": message}
+            if data is not None:
+                entry["data"] = json.loads(data)
+            out.append(entry)
+        return out
+
+    def claim(self, job_id):
+        conn = self._conn()
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, updated_at = ? "
+            "WHERE job_id = ? AND status = 'queued'",
+            (OWNER, time.time(), job_id),
+        )
+        if cur.rowcount != 1:
+            return None
+        row = conn.execute(
+            "SELECT pdf, form_data, base_url FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        pdf, form_data, base_url = row
+        return bytes(pdf), json.loads(form_data or "{}"), base_url or ""
+
+    def append_progress(self, job_id, message, kind="progress", data=None):
+        conn = self._conn()
+        # single statement, so the seq allocation is atomic
+        conn.execute(
+            "INSERT INTO job_progress (job_id, seq, message, kind, data) "
+            "SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ? FROM job_progress WHERE job_id = ?",
+            (job_id, message, kind, json.dumps(data) if data is not None else None, job_id),
+        )
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+
+    def finish(self, job_id, result=None, error=None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, pdf = NULL, updated_at = ? WHERE job_id = ?",
+            (
+                "error" if error is not None else "done",
+                json.dumps(result) if result is not None else None,
+                error,
+                time.time(),
+                job_id,
+            ),
+        )
+
+    def active_count(self):
+        (count,) = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()
+        return count
+
+    def purge_expired(self, ttl_seconds):
+        conn = self._conn()
+        cutoff = time.time() - ttl_seconds
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM job_progress WHERE job_id IN ("
+                "SELECT job_id FROM jobs WHERE status IN ('done', 'error') AND updated_at < ?)",
+                (cutoff,),
+            )
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'error') AND updated_at < ?", (cutoff,)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount
+
+    def recover(self, stale_seconds):
+        conn = self._conn()
+        cutoff = time.time() - stale_seconds
+        requeue = [
+            job_id
+            for job_id, owner, updated_at in conn.execute(
+                "SELECT job_id, owner, updated_at FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            if _owner_is_dead(owner) or updated_at < cutoff
+        ]
+        for job_id in requeue:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? "
+                "WHERE job_id = ? AND status = 'running'",
+                (time.time(), job_id),
+            )
+            self.append_progress(job_id, "Worker restarted; job re-queued")
+        return [
+            job_id for (job_id,) in conn.execute(
+                "SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            )
+        ]
+
+
+def make_job_store(kind: str | None = None, path: str | None = None) -> JobStore:
+    """Build the store selected by JOB_STORE ("sqlite" default, or "memory")."""
+    kind = (kind or os.getenv("JOB_STORE", "sqlite")).lower()
+    if kind == "memory":
+        return MemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore(path or os.getenv("JOB_DB_PATH", os.path.join("user_data", "jobs.sqlite3")))
+    raise ValueError(f"Unknown JOB_STORE: {kind}")
@@ -0,0 +1,17 @@
+# percentile summary for the rolling latency windows reported by /api/metrics
+# (pdf_extract.TIMINGS, llm_stream.StreamTimings)
+
+from __future__ import annotations
+
+
+def summarize(samples) -> dict:
+    """{"samples", "p50", "p95", "max"} in seconds for a window of timings (zeros when empty)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"samples": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "samples": len(ordered),
+        "p50": round(ordered[len(ordered) // 2], 4),
+        "p95": round(ordered[int(len(ordered) * 0.95)], 4),
+        "max": round(ordered[-1], 4),
+    }
@@ -0,0 +1,146 @@
+# response cache for call_gemini: prompts built from (story, word/question, temperature, profile)
+# repeat all day across a classroom, so identical prompts reuse the first completion
+
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LLMCache:
+    def __init__(self, max_bytes: int, ttl_seconds: float, sqlite_path: str | None = None, sqlite_max_bytes: int = 0):
+        """
+        max_bytes: memory budget (sum of cached completion sizes), LRU-evicted
+        ttl_seconds: entries older than this are treated as misses
+        sqlite_path: optional persistent tier that survives restarts (shared by local workers)
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size = 0
+        self.evictions = 0
+        self._items: OrderedDict[str, tuple[float, str]] = OrderedDict()  # key -> (expires_at, text)
+        self._lock = threading.Lock()
+        self._routes: dict[str, list[int]] = {}  # route -> [hits, misses]
+
+        self.sqlite_path = sqlite_path
+        self.sqlite_max_bytes = sqlite_max_bytes
+        self._puts_since_prune = 0
+        self._local = threading.local()
+        if sqlite_path:
+            parent = os.path.dirname(sqlite_path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.sqlite_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ---- memory tier ----
+
+    def _mem_get(self, key: str, now: float) -> str | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, text = item
+            if expires_at < now:
+                del self._items[key]
+                self.size -= len(text)
+                return None
+            self._items.move_to_end(key)
+            return text
+
+    def _mem_put(self, key: str, text: str, expires_at: float) -> None:
+        if len(text) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._items[key] = (expires_at, text)
+            self.size += len(text)
+            while self.size > self.max_bytes and self._items:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    # ---- public api ----
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        text = self._mem_get(key, now)
+        if text is not None or not self.sqlite_path:
+            return text
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            return None
+        conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        self._mem_put(key, row[0], row[1])  # promote
+        return row[0]
+
+    def put(self, key: str, text: str) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        self._mem_put(key, text, expires_at)
+        if not self.sqlite_path:
+            return
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed) VALUES (?, ?, ?, ?)",
+            (key, text, expires_at, now),
+        )
+        self._puts_since_prune += 1
+        if self._puts_since_prune >= 50:  # pruning scans the table, so batch it
+            self._puts_since_prune = 0
+            self._prune(conn, now)
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        if self.sqlite_max_bytes <= 0:
+            return
+        (total,) = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM llm_cache").fetchone()
+        if total <= self.sqlite_max_bytes:
+            return
+        # drop least recently used rows until under budget
+        for key, size in conn.execute("SELECT key, LENGTH(value) FROM llm_cache ORDER BY accessed").fetchall():
+            if total <= self.sqlite_max_bytes:
+                break
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def record(self, route: str, hit: bool) -> None:
+        with self._lock:
+            counts = self._routes.setdefault(route, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {
+                route: {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                }
+                for route, (hits, misses) in self._routes.items()
+            }
+            return {
+                "entries": len(self._items),
+                "memory_bytes": self.size,
+                "memory_max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": bool(self.sqlite_path),
+                "routes": routes,
+            }
@@ -0,0 +1,74 @@
+# helpers for streaming gemini completions to the browser over server-sent events
+# (qa_chat / submit_answer / define stream variants): SSE framing, cutting the text into
+# sentences as it arrives so the client can start TTS early, and time-to-first-token stats
+
+from __future__ import annotations
+import json
+import re
+import threading
+from collections import deque
+
+from latency_stats import summarize
+
+# end of a sentence, once we've seen what follows it ("3.5" or "..." mid-stream isn't an end yet)
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class SentenceSplitter:
+    """Feed text deltas, get back the sentences they complete."""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, delta: str) -> list[str]:
+        self._pending += delta
+        sentences = []
+        while True:
+            match = _SENTENCE_END.search(self._pending)
+            if match is None:
+                return sentences
+            sentence = self._pending[:match.end()].strip()
+            self._pending = self._pending[match.end():]
+            if sentence:
+                sentences.append(sentence)
+
+    def finish(self) -> list[str]:
+        rest, self._pending = self._pending.strip(), ""
+        return [rest] if rest else []
+
+
+class StreamTimings:
+    """Time-to-first-token and total stream time per route (p50/p95 over a window), for /api/metrics."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: dict[str, dict[str, deque]] = {}
+        self._counts: dict[str, dict[str, int]] = {}
+
+    def _route(self, route):
+        if route not in self._samples:
+            self._samples[route] = {"ttft": deque(maxlen=self.window), "total": deque(maxlen=self.window)}
+            self._counts[route] = {"streams": 0, "cache_hits": 0, "errors": 0, "busy": 0}
+        return route
+
+    def add(self, route, name, seconds):
+        with self._lock:
+            self._samples[self._route(route)][name].append(seconds)
+
+    def count(self, route, name):
+        with self._lock:
+            self._counts[self._route(route)][name] += 1
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for route, samples in self._samples.items():
+                out[route] = dict(self._counts[route])
+                for name, values in samples.items():
+                    out[route][f"{name}_seconds"] = summarize(values)
+            return out
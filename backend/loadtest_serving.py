@@ -0,0 +1,149 @@
+# load test: sync (gunicorn threads) vs async (uvicorn asgi_app) serving, concurrency vs memory
+# drives GET /api/profile, whose only upstream is PostgREST, against the local stand-in
+# from bench_supabase_pool.py with a fixed per-query latency (no Supabase project needed;
+# the server still needs the usual .env for the Google clients app.py creates at import)
+#
+# usage: python loadtest_serving.py [--levels 10,50,100,200] [--latency-ms 300] [--rounds 3]
+# requires gunicorn, uvicorn and httpx (requirements-prod.txt)
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_supabase_pool import FAKE_KEY, start_server
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Resident memory of pid plus its children (gunicorn/uvicorn worker processes), Linux /proc."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def server_command(mode, port, concurrency):
+    if mode == "sync":
+        # one thread per in-flight request is the only way the sync app reaches this concurrency
+        return [sys.executable, "-m", "gunicorn", "app:app", "-w", "1", "--threads", str(concurrency),
+                "-b", f"127.0.0.1:{port}", "--log-level", "warning"]
+    return [sys.executable, "-m", "uvicorn", "asgi_app:application", "--workers", "1",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+
+
+async def wait_ready(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(f"{base_url}/api/hello")
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+
+async def run_level(base_url, pid, concurrency, rounds):
+    samples, peak_rss, failures = [], 0.0, 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+
+        async def one(i):
+            nonlocal failures
+            started = time.perf_counter()
+            try:
+                # distinct user ids so the profile cache can't answer for the upstream
+                resp = await client.get(f"{base_url}/api/profile", params={"user_id": f"load-{i}-{time.time_ns()}"})
+                if resp.status_code != 200:
+                    failures += 1
+            except httpx.HTTPError:
+                failures += 1
+            samples.append(time.perf_counter() - started)
+
+        async def sample_memory(stop):
+            nonlocal peak_rss
+            while not stop.is_set():
+                peak_rss = max(peak_rss, rss_mb(pid))
+                await asyncio.sleep(0.05)
+
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_memory(stop))
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await asyncio.gather(*(one(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+
+    samples.sort()
+    return {
+        "concurrency": concurrency,
+        "req_per_s": round(len(samples) / elapsed, 1),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+        "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+        "failures": failures,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--levels", default="10,50,100,200")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    upstream, upstream_url = start_server(0, args.latency_ms / 1000)
+    env = {
+        **os.environ,
+        "SUPABASE_URL": upstream_url,
+        "SUPABASE_KEY": FAKE_KEY,
+        "PROFILE_CACHE_TTL_SECONDS": "0",
+    }
+    levels = [int(level) for level in args.levels.split(",")]
+
+    print(f"GET /api/profile, upstream latency {args.latency_ms:.0f} ms, {args.rounds} rounds per level")
+    for mode in args.modes.split(","):
+        for concurrency in levels:
+            port = free_port()
+            env["SUPABASE_POOL_SIZE"] = str(concurrency)
+            proc = subprocess.Popen(server_command(mode, port, concurrency), env=env,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                await wait_ready(base_url)
+                idle = rss_mb(proc.pid)
+                result = await run_level(base_url, proc.pid, concurrency, args.rounds)
+                print(f"  {mode:<5} idle_rss_mb={idle:.1f} {result}")
+            finally:
+                proc.terminate()
+                proc.wait()
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,330 @@
+# shared PDF text extraction for upload_pdf, upload_story and the illustration pipeline
+# results are cached on the sha256 of the PDF bytes, so a story uploaded for reading
+# and then for illustration is only parsed once
+
+from __future__ import annotations
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+
+from blob_cache import build_cache
+from latency_stats import summarize
+
+# pages >= this go to the process pool; smaller docs are cheaper to parse inline (0 = always offload)
+PDF_POOL_MIN_PAGES = int(os.getenv("PDF_POOL_MIN_PAGES", "20"))
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# big docs are split into page ranges of at least this many pages, one pool task each
+PDF_MIN_PAGES_PER_TASK = int(os.getenv("PDF_MIN_PAGES_PER_TASK", "10"))
+# guards, checked before any text is extracted
+PDF_MAX_BYTES = int(float(os.getenv("PDF_MAX_MB", "50")) * 1024 * 1024)
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+# seconds a caller waits for the whole parse (queueing included)
+PDF_PARSE_TIMEOUT = float(os.getenv("PDF_PARSE_TIMEOUT", "60"))
+
+PDF_CACHE = build_cache(
+    os.getenv("PDF_CACHE_DIR", os.path.join("user_data", "pdf_cache")),
+    memory_mb=float(os.getenv("PDF_CACHE_MEMORY_MB", "32")),
+    disk_mb=float(os.getenv("PDF_CACHE_DISK_MB", "256")),
+    suffix=".json",
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ---------------------------
+# segmentation
+# ---------------------------
+
+class StorySegmenter:
+    """
+    First non-empty line is the title; the rest is joined with spaces and
+    naively split at sentence breaks (can improve this later using NLP or by
+    detecting longer pauses). The trailing piece is held back after each page
+    because the sentence may continue on the next one, so feeding pages one by
+    one gives exactly the same paragraphs as segmenting the whole text.
+    """
+    SPLIT_RE = re.compile(r'(?<=[.?!])\s+(?=[A-Z“"])')
+
+    def __init__(self):
+        self.title = None
+        self.spans = []  # (first_page, last_page) for every paragraph returned so far
+        self._pending = ""
+        self._pending_pages = None
+
+    def feed(self, page_text, page=1):
+        """Add one page of text (page = its 1-based number); returns the paragraphs completed so far."""
+        lines = [line.strip() for line in page_text.splitlines() if line.strip()]
+        if self.title is None and lines:
+            self.title = lines[0]
+            lines = lines[1:]
+        if not lines:
+            return []
+        # Replace internal line breaks with spaces (fixes weird splits like "With\na smile")
+        text = " ".join(lines)
+        if self._pending:
+            carried = len(self._pending)
+            first_page, last_page = self._pending_pages
+            self._pending = f"{self._pending} {text}"
+        else:
+            carried = 0
+            first_page = last_page = page
+            self._pending = text
+
+        paragraphs = []
+        start = 0
+        for match in self.SPLIT_RE.finditer(self._pending):
+            piece = self._pending[start:match.start()].strip()
+            if piece:
+                paragraphs.append(piece)
+                self.spans.append((first_page, last_page if match.start() <= carried else page))
+            start = match.end()
+            first_page = page
+        self._pending = self._pending[start:]
+        self._pending_pages = (first_page, page)
+        return paragraphs
+
+    def finish(self):
+        """Flush the last paragraph."""
+        rest, self._pending = self._pending.strip(), ""
+        if not rest:
+            return []
+        self.spans.append(self._pending_pages)
+        return [rest]
+
+
+def split_sentences(text):
+    # mirrors splitSentences in ExtractedText.tsx so warmed clips match what the player requests
+    return [s.strip() for s in re.findall(r"[^.!?]+[.!?]+", text) if s.strip()]
+
+
+def segment_pages(page_texts):
+    """(title, paragraphs, page_spans) for a list of per-page texts."""
+    segmenter = StorySegmenter()
+    paragraphs = []
+    for number, page_text in enumerate(page_texts, start=1):
+        paragraphs.extend(segmenter.feed(page_text, page=number))
+    paragraphs.extend(segmenter.finish())
+    return segmenter.title or "Untitled", paragraphs, [list(span) for span in segmenter.spans]
+
+
+def segment_story_text(raw_text):
+    """Split extracted pdf text into (title, paragraphs)."""
+    title, paragraphs, _ = segment_pages([raw_text])
+    return title, paragraphs
+
+
+# ---------------------------
+# extraction
+# ---------------------------
+
+class PDFTooLarge(Exception):
+    """The PDF is over PDF_MAX_MB / PDF_MAX_PAGES."""
+
+
+class PDFParseTimeout(Exception):
+    """Parsing did not finish within PDF_PARSE_TIMEOUT."""
+
+
+class PDFParseFailed(Exception):
+    """A pool worker died while parsing (e.g. PyMuPDF crashed on a malformed PDF)."""
+
+
+class _Timings:
+    """Queue-wait and parse-time samples for sizing the pool."""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self._samples = {"queue_wait": deque(maxlen=window), "parse": deque(maxlen=window)}
+        self.counts = {"inline": 0, "pool": 0, "pool_tasks": 0, "rejected": 0, "timeouts": 0, "pool_crashes": 0}
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counts)
+            for name, samples in self._samples.items():
+                out[f"{name}_seconds"] = summarize(samples)
+            return out
+
+
+TIMINGS = _Timings()
+
+
+def _page_range_texts(pdf_bytes, start, stop, submitted_at):
+    # top-level so it can run in a pool process; returns (queue_wait, parse_seconds, texts)
+    started = time.time()
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        texts = [doc[i].get_text("text") for i in range(start, stop)]
+    return started - submitted_at, time.time() - started, texts
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs request threads can copy held locks
+            context = multiprocessing.get_context(os.getenv("PDF_POOL_START_METHOD", "spawn"))
+            _pool = ProcessPoolExecutor(max_workers=PDF_PROCESS_WORKERS, mp_context=context)
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next parse starts a fresh one (another thread may have already)."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def check_pdf_size(pdf_bytes):
+    """Raises PDFTooLarge before anything is queued (cheap: bytes only)."""
+    if len(pdf_bytes) > PDF_MAX_BYTES:
+        TIMINGS.count("rejected")
+        raise PDFTooLarge(f"PDF is {len(pdf_bytes) / 1024 / 1024:.1f} MB; the limit is {PDF_MAX_BYTES / 1024 / 1024:.0f} MB")
+
+
+def _page_count(pdf_bytes):
+    check_pdf_size(pdf_bytes)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+    if page_count > PDF_MAX_PAGES:
+        TIMINGS.count("rejected")
+        raise PDFTooLarge(f"PDF has {page_count} pages; the limit is {PDF_MAX_PAGES}")
+    return page_count
+
+
+def _parse_pages(pdf_bytes, page_count):
+    """
+    Yields page texts in order. Small docs are read inline; big ones are split
+    into page ranges parsed in parallel by the process pool, so the request
+    thread only waits (and doesn't hold the GIL doing PyMuPDF work).
+    """
+    deadline = time.monotonic() + PDF_PARSE_TIMEOUT
+    if page_count < PDF_POOL_MIN_PAGES:
+        TIMINGS.count("inline")
+        started = time.monotonic()
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            for page in doc:
+                if time.monotonic() > deadline:
+                    TIMINGS.count("timeouts")
+                    raise PDFParseTimeout(f"PDF parsing took longer than {PDF_PARSE_TIMEOUT:.0f}s")
+                yield page.get_text("text")
+        TIMINGS.add("parse", time.monotonic() - started)
+        return
+
+    tasks = max(1, min(PDF_PROCESS_WORKERS, page_count // max(1, PDF_MIN_PAGES_PER_TASK)))
+    step = -(-page_count // tasks)  # ceil
+    pool = _get_pool()
+    submitted_at = time.time()
+    futures = []
+    try:
+        for start in range(0, page_count, step):
+            futures.append(pool.submit(_page_range_texts, pdf_bytes, start, min(start + step, page_count), submitted_at))
+        TIMINGS.count("pool")
+        TIMINGS.count("pool_tasks", len(futures))
+        for future in futures:
+            try:
+                queue_wait, parse_seconds, texts = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                TIMINGS.count("timeouts")
+                raise PDFParseTimeout(f"PDF parsing took longer than {PDF_PARSE_TIMEOUT:.0f}s")
+            TIMINGS.add("queue_wait", queue_wait)
+            TIMINGS.add("parse", parse_seconds)
+            yield from texts
+    except BrokenProcessPool:
+        # a dead worker breaks the whole executor; replace it rather than failing every later parse
+        TIMINGS.count("pool_crashes")
+        _discard_pool(pool)
+        raise PDFParseFailed("The PDF could not be parsed (the parser crashed); it may be damaged.")
+    finally:
+        # drop ranges that haven't started (a range already running can't be interrupted)
+        for future in futures:
+            future.cancel()
+
+
+def pdf_digest(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def build_result(digest, page_texts):
+    """The cached extraction record, built from raw per-page text."""
+    title, paragraphs, spans = segment_pages(page_texts)
+    return {
+        "digest": digest,
+        "page_count": len(page_texts),
+        "pages": page_texts,
+        "text": "\n".join(page_texts),
+        "title": title,
+        "paragraphs": paragraphs,
+        "page_spans": spans,
+        "sentences": [split_sentences(p) for p in paragraphs],
+    }
+
+
+def _store(result):
+    PDF_CACHE.put(result["digest"], json.dumps(result).encode("utf-8"))
+
+
+def extract_pdf(pdf_bytes):
+    """
+    Per-page text plus title/paragraph/sentence segmentation for a PDF.
+    Returns {"digest", "page_count", "pages", "text", "title", "paragraphs",
+    "page_spans" (1-based [first, last] page per paragraph), "sentences"}.
+    Raises PDFTooLarge / PDFParseTimeout.
+    """
+    digest = pdf_digest(pdf_bytes)
+    cached = PDF_CACHE.get(digest)
+    if cached is not None:
+        return json.loads(cached)
+    result = build_result(digest, list(_parse_pages(pdf_bytes, _page_count(pdf_bytes))))
+    _store(result)
+    return result
+
+
+def iter_pdf_pages(pdf_bytes):
+    """
+    Yields (page_number, page_text) as pages are read, for callers that stream
+    results back; the full record is cached once the last page is done.
+    """
+    digest = pdf_digest(pdf_bytes)
+    cached = PDF_CACHE.get(digest)
+    if cached is not None:
+        yield from enumerate(json.loads(cached)["pages"], start=1)
+        return
+    page_texts = []
+    for number, text in enumerate(_parse_pages(pdf_bytes, _page_count(pdf_bytes)), start=1):
+        page_texts.append(text)
+        yield number, text
+    _store(build_result(digest, page_texts))
+
+
+def cache_stats():
+    return PDF_CACHE.stats()
+
+
+def pool_stats():
+    return {
+        "workers": PDF_PROCESS_WORKERS,
+        "pool_min_pages": PDF_POOL_MIN_PAGES,
+        "max_pages": PDF_MAX_PAGES,
+        "max_bytes": PDF_MAX_BYTES,
+        "timeout_seconds": PDF_PARSE_TIMEOUT,
+        **TIMINGS.stats(),
+    }
@@ -0,0 +1,131 @@
+# per-user profile cache for get_profile and _profile_context
+# profile reads happen on every page load and every qa_chat call but only change
+# when the questionnaire is saved, so rows are cached (bounded LRU + TTL) and
+# save_questionnaire invalidates the user's entry
+
+from __future__ import annotations
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+
+def _token_digest(access_token: str | None) -> str:
+    return hashlib.sha256((access_token or "").encode("utf-8")).hexdigest()[:16]
+
+
+class _Entry:
+    __slots__ = ("version", "profile", "token", "expires_at", "context")
+
+    def __init__(self, version, profile, token, expires_at):
+        self.version = version
+        self.profile = profile
+        self.token = token
+        self.expires_at = expires_at
+        self.context = None  # rendered lazily, once per version
+
+
+class ProfileCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        max_entries: users kept (least recently used dropped first)
+        ttl_seconds: upper bound on staleness, e.g. a save handled by another worker
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.context_renders = 0
+        self._items: OrderedDict[str, _Entry] = OrderedDict()
+        self._versions = itertools.count(1)
+        # bumped by invalidate(); a load that started before the bump mustn't be cached
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self.stale_loads = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, user_id: str, access_token: str | None) -> tuple[_Entry | None, int]:
+        """(entry, None) on a hit; (None, generation) on a miss, to hand back to _store."""
+        with self._lock:
+            entry = self._items.get(user_id)
+            # rows were read under the caller's RLS, so a different token refetches
+            if entry is None or entry.expires_at < time.time() or entry.token != _token_digest(access_token):
+                self.misses += 1
+                return None, self._generations.get(user_id, 0)
+            self._items.move_to_end(user_id)
+            self.hits += 1
+            return entry, None
+
+    def _store(self, user_id: str, access_token: str | None, profile: dict | None, generation: int) -> _Entry:
+        entry = _Entry(next(self._versions), profile, _token_digest(access_token), time.time() + self.ttl_seconds)
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                # invalidated while loader() ran: this row may predate the save, so serve it once but don't keep it
+                self.stale_loads += 1
+                return entry
+            self._items[user_id] = entry
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return entry
+
+    def _entry(self, user_id, access_token, loader) -> _Entry:
+        entry, generation = self._lookup(user_id, access_token)
+        if entry is None:
+            entry = self._store(user_id, access_token, loader(), generation)
+        return entry
+
+    def get(self, user_id: str, access_token: str | None, loader) -> dict | None:
+        """Cached profile row for user_id; loader() fetches it on a miss (None = no profile yet)."""
+        return self._entry(user_id, access_token, loader).profile
+
+    def context(self, user_id: str, access_token: str | None, loader, render) -> str:
+        """render(profile) memoized per profile version."""
+        entry = self._entry(user_id, access_token, loader)
+        if entry.context is None:
+            entry.context = render(entry.profile)
+            with self._lock:
+                self.context_renders += 1
+        return entry.context
+
+    # async variants for asgi_app.py: loader is a coroutine function
+    async def _entry_async(self, user_id, access_token, loader) -> _Entry:
+        entry, generation = self._lookup(user_id, access_token)
+        if entry is None:
+            entry = self._store(user_id, access_token, await loader(), generation)
+        return entry
+
+    async def get_async(self, user_id: str, access_token: str | None, loader) -> dict | None:
+        return (await self._entry_async(user_id, access_token, loader)).profile
+
+    async def context_async(self, user_id: str, access_token: str | None, loader, render) -> str:
+        entry = await self._entry_async(user_id, access_token, loader)
+        if entry.context is None:
+            entry.context = render(entry.profile)
+            with self._lock:
+                self.context_renders += 1
+        return entry.context
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.pop(user_id, 0) + 1
+            while len(self._generations) > self.max_entries:
+                self._generations.popitem(last=False)
+            if self._items.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "stale_loads": self.stale_loads,
+                "context_renders": self.context_renders,
+            }
@@ -0,0 +1,91 @@
+# legacy profile.json persistence: locked read-modify-write + atomic replace
+# readers (including other workers) only ever see the old or the new file, never half of one
+
+from __future__ import annotations
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ProfileStore:
+    def __init__(self, path: str, mirror_path: str | None = None):
+        """
+        path: the durable profile.json
+        mirror_path: optional copy (e.g. frontend/public/profile.json) refreshed in the background
+        """
+        self.path = path
+        self.mirror_path = mirror_path
+        self._lock_path = f"{path}.lock"
+        self._thread_lock = threading.Lock()
+        self._mirror = ThreadPoolExecutor(max_workers=1) if mirror_path else None
+        self._mirror_pending = False
+        self._mirror_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        # thread lock for this process, file lock for other workers
+        with self._thread_lock, open(self._lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"questionnaire": {}, "struggles": []}
+
+    def update(self, change) -> dict:
+        """Apply change(profile) -> profile under the lock and write it atomically."""
+        with self._locked():
+            profile = change(self.load())
+            _atomic_write(self.path, json.dumps(profile, separators=(",", ":")).encode("utf-8"))
+        self._schedule_mirror()
+        return profile
+
+    def _schedule_mirror(self) -> None:
+        if self._mirror is None:
+            return
+        with self._mirror_lock:
+            if self._mirror_pending:
+                return  # the queued copy will pick up this write too
+            self._mirror_pending = True
+        self._mirror.submit(self._copy_to_mirror)
+
+    def _copy_to_mirror(self) -> None:
+        with self._mirror_lock:
+            self._mirror_pending = False
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            _atomic_write(self.mirror_path, data)
+        except OSError as e:
+            print(f"[⚠️ Could not mirror profile to {self.mirror_path}] {e}")
@@ -0,0 +1,276 @@
+# token-bucket rate limiting shared across threads, processes and (with redis) hosts
+# one bucket per upstream quota: gemini, gemini_tts, tts, stt, image
+
+from __future__ import annotations
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class RateLimited(Exception):
+    """Raised when a token could not be acquired within the allowed wait."""
+
+    def __init__(self, bucket: str, retry_after: float):
+        super().__init__(f"Rate limit reached for {bucket}; retry in {retry_after:.1f}s")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+def _take(tokens: float, rate: float) -> tuple[float, float]:
+    """Returns (tokens_after, wait_seconds); wait 0 means a token was taken."""
+    if tokens >= 1.0:
+        return tokens - 1.0, 0.0
+    return tokens, (1.0 - tokens) / rate
+
+
+# ---------------------------
+# backends: take(name, rate, capacity) -> seconds to wait (0 = got a token)
+# ---------------------------
+
+class MemoryBucketBackend:
+    """Per-process buckets (fine for a single worker)."""
+
+    def __init__(self):
+        self._state: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, name: str, rate: float, capacity: float) -> float:
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._state.get(name, (capacity, now))
+            tokens, wait = _take(_refill(tokens, updated, now, rate, capacity), rate)
+            self._state[name] = (tokens, now)
+            return wait
+
+
+class SQLiteBucketBackend:
+    """Buckets in a sqlite file; BEGIN IMMEDIATE serializes every process on this host."""
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = str(path)
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, name: str, rate: float, capacity: float) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, wait = _take(_refill(tokens, updated, now, rate, capacity), rate)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RedisBucketBackend:
+    """
+    Buckets in a redis-protocol store, shared across hosts.
+    Only uses GET/SET(nx, px)/DELETE, so any client exposing those works
+    (redis-py, fakeredis, or a small local stand-in).
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:", lock_ms: int = 2000):
+        self.client = client
+        self.prefix = prefix
+        self.lock_ms = lock_ms
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBucketBackend":
+        import redis  # optional dependency, only needed for this backend
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, name: str, rate: float, capacity: float) -> float:
+        key = self.prefix + name
+        lock_key = key + ":lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ms / 1000
+        while not self.client.set(lock_key, token, nx=True, px=self.lock_ms):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Could not lock rate-limit bucket {name}")
+            time.sleep(0.005)
+        try:
+            now = time.time()
+            raw = self.client.get(key)
+            if raw:
+                state = json.loads(raw)
+                tokens, updated = state["tokens"], state["updated"]
+            else:
+                tokens, updated = capacity, now
+            tokens, wait = _take(_refill(tokens, updated, now, rate, capacity), rate)
+            self.client.set(key, json.dumps({"tokens": tokens, "updated": now}))
+            return wait
+        finally:
+            current = self.client.get(lock_key)
+            if current is not None and (current.decode() if isinstance(current, bytes) else current) == token:
+                self.client.delete(lock_key)
+
+
+# ---------------------------
+# buckets
+# ---------------------------
+
+class TokenBucket:
+    def __init__(self, name: str, per_minute: float, burst: float | None = None, backend=None):
+        """
+        name: bucket id shared by every worker using the same backend
+        per_minute: sustained rate
+        burst: bucket capacity (defaults to per_minute, i.e. the old sliding-window behaviour)
+        """
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.backend = backend or MemoryBucketBackend()
+        self.acquired = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.throttled_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token without waiting; returns 0 on success, else seconds until one is free."""
+        wait = self.backend.take(self.name, self.rate, self.capacity)
+        if wait == 0:
+            with self._lock:
+                self.acquired += 1
+        return wait
+
+    def acquire(self, timeout: float | None = None) -> None:
+        """Block until a token is available; raises RateLimited if that would take longer than timeout."""
+        started = time.monotonic()
+        waited = False
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                if waited:
+                    with self._lock:
+                        self.throttled += 1
+                        self.throttled_wait_seconds += time.monotonic() - started
+                return
+            elapsed = time.monotonic() - started
+            if timeout is not None and elapsed + wait > timeout:
+                with self._lock:
+                    self.rejected += 1
+                    self.throttled_wait_seconds += elapsed
+                raise RateLimited(self.name, wait)
+            waited = True
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout: float | None = None) -> None:
+        """acquire() for the event loop: backend calls run in a thread, waits are asyncio.sleep."""
+        started = time.monotonic()
+        waited = False
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire)
+            if wait == 0:
+                if waited:
+                    with self._lock:
+                        self.throttled += 1
+                        self.throttled_wait_seconds += time.monotonic() - started
+                return
+            elapsed = time.monotonic() - started
+            if timeout is not None and elapsed + wait > timeout:
+                with self._lock:
+                    self.rejected += 1
+                    self.throttled_wait_seconds += elapsed
+                raise RateLimited(self.name, wait)
+            waited = True
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {
+            "per_minute": round(self.rate * 60, 3),
+            "burst": self.capacity,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "throttled_wait_seconds": round(self.throttled_wait_seconds, 3),
+        }
+
+
+def make_backend(kind: str | None = None):
+    """RATE_LIMIT_BACKEND: "sqlite" (default, all workers on this host), "memory", or "redis"."""
+    kind = (kind or os.getenv("RATE_LIMIT_BACKEND", "sqlite")).lower()
+    if kind == "memory":
+        return MemoryBucketBackend()
+    if kind == "sqlite":
+        return SQLiteBucketBackend(os.getenv("RATE_LIMIT_DB_PATH", os.path.join("user_data", "ratelimit.sqlite3")))
+    if kind == "redis":
+        return RedisBucketBackend.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {kind}")
+
+
+# default per-minute quotas; override with RATE_LIMIT_<NAME>_PER_MIN / RATE_LIMIT_<NAME>_BURST
+DEFAULT_LIMITS = {
+    "gemini": 10,       # text generation (safe margin below the 15 RPM free tier)
+    "gemini_tts": 10,   # tts_service (Gemini TTS preview model)
+    "tts": 300,         # Google Cloud Text-to-Speech
+    "tts_warmup": 60,   # share of the tts quota the story warm-up may use (it also takes a "tts" token)
+    "stt": 300,         # Google Cloud Speech-to-Text
+    "image": 5,         # OpenAI image generation
+}
+
+# max seconds a caller waits for a token before giving up
+MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT", "10"))
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+_backend = None
+
+
+def get_bucket(name: str) -> TokenBucket:
+    """Process-wide bucket for an upstream (created on first use)."""
+    global _backend
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            if _backend is None:
+                _backend = make_backend()
+            env = name.upper()
+            per_minute = float(os.getenv(f"RATE_LIMIT_{env}_PER_MIN", DEFAULT_LIMITS.get(name, 60)))
+            burst = os.getenv(f"RATE_LIMIT_{env}_BURST")
+            bucket = TokenBucket(name, per_minute, float(burst) if burst else None, backend=_backend)
+            _buckets[name] = bucket
+        return bucket
+
+
+def acquire(name: str, timeout: float | None = None) -> None:
+    """Count one upstream call against bucket `name` (waits up to RATE_LIMIT_MAX_WAIT by default)."""
+    get_bucket(name).acquire(MAX_WAIT_SECONDS if timeout is None else timeout)
+
+
+async def acquire_async(name: str, timeout: float | None = None) -> None:
+    """acquire() for async handlers (asgi_app.py)."""
+    await get_bucket(name).acquire_async(MAX_WAIT_SECONDS if timeout is None else timeout)
+
+
+def stats() -> dict:
+    with _buckets_lock:
+        return {name: bucket.stats() for name, bucket in _buckets.items()}
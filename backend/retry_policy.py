@@ -0,0 +1,110 @@
+# retry/backoff policy for upstream calls (call_gemini and its async twin)
+# each request gets a deadline; waits use jittered backoff or the server's retry-after
+# hint, and we give up as soon as the next attempt couldn't finish in time
+
+from __future__ import annotations
+import os
+import random
+import re
+import time
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        deadline_seconds: float = 20.0,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 8.0,
+        wait_for_limiter: bool = False,
+    ):
+        """
+        deadline_seconds: total time budget for one call, waits included
+        max_attempts: upstream attempts (limiter refusals don't count as attempts)
+        base_delay / max_delay: exponential backoff bounds when there's no retry-after hint
+        wait_for_limiter: wait out the local rate limiter for the whole deadline instead of the
+                          usual RATE_LIMIT_MAX_WAIT cap (background work that isn't in a hurry)
+        """
+        self.deadline_seconds = deadline_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.wait_for_limiter = wait_for_limiter
+
+    @classmethod
+    def from_env(cls, name: str, default: "RetryPolicy") -> "RetryPolicy":
+        """Override with RETRY_<NAME>_DEADLINE_SECONDS / _MAX_ATTEMPTS / _BASE_DELAY / _MAX_DELAY."""
+        env = f"RETRY_{name.upper()}_"
+        return cls(
+            deadline_seconds=float(os.getenv(env + "DEADLINE_SECONDS", default.deadline_seconds)),
+            max_attempts=int(os.getenv(env + "MAX_ATTEMPTS", default.max_attempts)),
+            base_delay=float(os.getenv(env + "BASE_DELAY", default.base_delay)),
+            max_delay=float(os.getenv(env + "MAX_DELAY", default.max_delay)),
+            wait_for_limiter=default.wait_for_limiter,
+        )
+
+    def start(self) -> "RetryBudget":
+        return RetryBudget(self)
+
+    def describe(self) -> dict:
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "max_attempts": self.max_attempts,
+            "base_delay": self.base_delay,
+            "max_delay": self.max_delay,
+            "wait_for_limiter": self.wait_for_limiter,
+        }
+
+
+class RetryBudget:
+    """State for one call: attempts used and time left."""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.attempts = 0
+        self._deadline = time.monotonic() + policy.deadline_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self._deadline - time.monotonic())
+
+    def limiter_timeout(self, cap: float) -> float:
+        """Seconds to wait for a local rate-limit token: the time left, capped unless the policy waits it out."""
+        return self.remaining() if self.policy.wait_for_limiter else min(self.remaining(), cap)
+
+    def next_delay(self, retry_after: float | None = None) -> float | None:
+        """
+        Call after a failed attempt. Returns seconds to wait before retrying,
+        or None to give up (out of attempts, or the wait would overrun the deadline).
+        """
+        self.attempts += 1
+        if self.attempts >= self.policy.max_attempts:
+            return None
+        if retry_after is not None:
+            # the server knows better than our backoff; small jitter keeps workers from retrying in lockstep
+            delay = retry_after + random.uniform(0, min(1.0, self.policy.base_delay))
+        else:
+            cap = min(self.policy.max_delay, self.policy.base_delay * 2 ** (self.attempts - 1))
+            delay = random.uniform(cap / 2, cap)  # "equal jitter"
+        if delay >= self.remaining():
+            return None
+        return delay
+
+
+_RETRY_IN_RE = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+
+
+def retry_after_hint(exc: Exception) -> float | None:
+    """Seconds the upstream asked us to wait, if the error says (RetryInfo, Retry-After header or message)."""
+    for detail in getattr(exc, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None and headers.get("Retry-After"):
+        try:
+            return float(headers.get("Retry-After"))
+        except ValueError:
+            pass
+    match = _RETRY_IN_RE.search(str(exc))
+    return float(match.group(1)) if match else None
@@ -0,0 +1,275 @@
+# single-flight coalescing: concurrent identical upstream calls share one call and its result
+# (a class opening the same story fires the same TTS/quiz/definition requests within a second)
+
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_groups: dict[str, "SingleFlight | AsyncSingleFlight"] = {}
+_groups_lock = threading.Lock()
+
+
+class WaitTimeout(TimeoutError):
+    """A waiter gave up on someone else's in-flight call (the call itself carries on)."""
+
+
+class Saturated(RuntimeError):
+    """stream() would need a pump thread and every one is busy (reject_when_busy groups only)."""
+
+
+class _Counters:
+    def __init__(self):
+        self.leaders = 0         # upstream calls actually made
+        self.collapsed = 0       # callers served by someone else's call
+        self.overflow = 0        # callers over max_waiters that made their own call
+        self.shared_errors = 0   # waiters that received the leader's exception
+        self.wait_timeouts = 0   # waiters that gave up before the leader finished
+        self.rejected = 0        # streams refused because every pump thread was busy
+        self.max_waiters_seen = 0
+
+    def as_dict(self, in_flight: int, max_waiters: int) -> dict:
+        calls = self.leaders + self.collapsed + self.overflow
+        return {
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "overflow": self.overflow,
+            "shared_errors": self.shared_errors,
+            "wait_timeouts": self.wait_timeouts,
+            "rejected": self.rejected,
+            "collapse_ratio": round(self.collapsed / calls, 4) if calls else 0.0,
+            "in_flight": in_flight,
+            "max_waiters": max_waiters,
+            "max_waiters_seen": self.max_waiters_seen,
+        }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _Broadcast:
+    """Chunks of one in-flight stream, replayed to every subscriber."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.waiters = 0
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    def __init__(self, name: str, max_waiters: int = 100, wait_timeout: float = 120.0, stream_workers: int = 4,
+                 reject_when_busy: bool = False):
+        """
+        max_waiters: callers allowed to wait on one key; the rest make their own call
+        wait_timeout: seconds a waiter waits for the leader before raising WaitTimeout
+                      (do() takes a shorter per-caller timeout)
+        stream_workers: threads pumping shared streams (see stream())
+        reject_when_busy: stream() raises Saturated instead of queueing a new stream behind busy pumps
+        """
+        self.name = name
+        self.max_waiters = max_waiters
+        self.wait_timeout = wait_timeout
+        self._calls: dict[str, _Call] = {}
+        self._streams: dict[str, _Broadcast] = {}
+        self._lock = threading.Lock()
+        self._counters = _Counters()
+        self.stream_workers = stream_workers
+        self.reject_when_busy = reject_when_busy
+        self._pumping = 0
+        self._pump = ThreadPoolExecutor(max_workers=stream_workers, thread_name_prefix=f"flight-{name}")
+        register(self)
+
+    def do(self, key: str, fn, timeout: float | None = None):
+        """
+        fn() once per key at a time; concurrent callers with the same key get its result (or exception).
+        timeout caps how long this caller waits on someone else's call (its own deadline, say),
+        since the leader may be running under a much longer one.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._counters.leaders += 1
+                leader = True
+            elif call.waiters >= self.max_waiters:
+                self._counters.overflow += 1
+                call, leader = None, False
+            else:
+                call.waiters += 1
+                self._counters.collapsed += 1
+                self._counters.max_waiters_seen = max(self._counters.max_waiters_seen, call.waiters)
+                leader = False
+
+        if call is None:
+            return fn()
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(self.wait_timeout if timeout is None else min(timeout, self.wait_timeout)):
+            with self._lock:
+                self._counters.wait_timeouts += 1
+            raise WaitTimeout(f"{self.name}: gave up waiting for the in-flight call")
+        if call.error is not None:
+            with self._lock:
+                self._counters.shared_errors += 1
+            raise call.error
+        return call.result
+
+    def stream(self, key: str, make_iter, on_complete=None):
+        """
+        Iterator over make_iter()'s items, shared by every concurrent caller with the same key.
+        The upstream iterator is pumped on a background thread, so one client disconnecting
+        doesn't cut the others off; on_complete(chunks) runs once if it finishes cleanly.
+        Joining a stream already in flight never needs a pump thread, so never raises Saturated.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None and broadcast.waiters < self.max_waiters:
+                broadcast.waiters += 1
+                self._counters.collapsed += 1
+                self._counters.max_waiters_seen = max(self._counters.max_waiters_seen, broadcast.waiters)
+                return self._replay(broadcast)
+            if self.reject_when_busy and self._pumping >= self.stream_workers:
+                self._counters.rejected += 1
+                raise Saturated(f"{self.name}: all {self.stream_workers} stream workers are busy")
+            if broadcast is None:
+                self._counters.leaders += 1
+                broadcast = self._streams[key] = _Broadcast()
+            else:
+                self._counters.overflow += 1
+                broadcast = _Broadcast()  # private stream, not joinable
+            self._pumping += 1
+        self._pump.submit(self._run_stream, key, broadcast, make_iter, on_complete)
+        return self._replay(broadcast)
+
+    def _run_stream(self, key, broadcast, make_iter, on_complete):
+        try:
+            for chunk in make_iter():
+                with broadcast.cond:
+                    broadcast.chunks.append(chunk)
+                    broadcast.cond.notify_all()
+        except BaseException as e:
+            broadcast.error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            with broadcast.cond:
+                broadcast.finished = True
+                broadcast.cond.notify_all()
+        try:
+            if broadcast.error is None and on_complete is not None:
+                on_complete(broadcast.chunks)
+        except Exception as e:
+            print(f"[⚠️ {self.name} on_complete failed] {e}")
+        finally:
+            with self._lock:
+                self._pumping -= 1
+
+    def _replay(self, broadcast):
+        index = 0
+        while True:
+            with broadcast.cond:
+                if not broadcast.cond.wait_for(
+                    lambda: index < len(broadcast.chunks) or broadcast.finished, timeout=self.wait_timeout
+                ):
+                    raise TimeoutError(f"{self.name}: stream stalled")
+                if index < len(broadcast.chunks):
+                    chunk = broadcast.chunks[index]
+                elif broadcast.error is not None:
+                    raise broadcast.error
+                else:
+                    return
+            index += 1
+            yield chunk
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self._counters.as_dict(len(self._calls) + len(self._streams), self.max_waiters)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop (asgi_app.py)."""
+
+    def __init__(self, name: str, max_waiters: int = 100, wait_timeout: float = 120.0):
+        self.name = name
+        self.max_waiters = max_waiters
+        self.wait_timeout = wait_timeout
+        self._calls: dict[str, tuple[asyncio.Future, list[int]]] = {}
+        self._counters = _Counters()
+        self._lock = threading.Lock()  # only for stats() from other threads
+        register(self)
+
+    async def do(self, key: str, coro_fn, timeout: float | None = None):
+        """See SingleFlight.do."""
+        entry = self._calls.get(key)
+        if entry is not None:
+            future, waiters = entry
+            if waiters[0] < self.max_waiters:
+                waiters[0] += 1
+                self._counters.collapsed += 1
+                self._counters.max_waiters_seen = max(self._counters.max_waiters_seen, waiters[0])
+                try:
+                    # shield: a waiter being cancelled must not cancel the shared call
+                    wait = self.wait_timeout if timeout is None else min(timeout, self.wait_timeout)
+                    return await asyncio.wait_for(asyncio.shield(future), wait)
+                except asyncio.TimeoutError:
+                    self._counters.wait_timeouts += 1
+                    raise WaitTimeout(f"{self.name}: gave up waiting for the in-flight call")
+                except Exception:
+                    self._counters.shared_errors += 1
+                    raise
+            self._counters.overflow += 1
+            return await coro_fn()
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = (future, [0])
+        self._counters.leaders += 1
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # the leader's client went away; waiters get an error rather than a cancellation
+            future.set_exception(RuntimeError(f"{self.name}: in-flight call was cancelled"))
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self._counters.as_dict(len(self._calls), self.max_waiters)
+
+
+def register(group) -> None:
+    with _groups_lock:
+        _groups[group.name] = group
+
+
+def stats() -> dict:
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {group.name: group.stats() for group in groups}
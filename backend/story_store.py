@@ -0,0 +1,123 @@
+# indexed story metadata store (sqlite), replacing one <story_id>.json file per story
+# lookups by user are an index range scan instead of opening every metadata file
+
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+SORT_COLUMNS = {"created_at", "title"}
+
+
+class StoryStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS stories (
+        id          TEXT PRIMARY KEY,
+        user_id     TEXT NOT NULL,
+        title       TEXT NOT NULL,
+        created_at  TEXT NOT NULL,
+        meta        TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_stories_user_created ON stories(user_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_stories_user_title ON stories(user_id, title);
+    CREATE TABLE IF NOT EXISTS store_migrations (
+        name    TEXT PRIMARY KEY,
+        count   INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = str(path)
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, meta: dict) -> None:
+        """Insert (or replace) one story's metadata; must have id, user_id, title, created_at."""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO stories (id, user_id, title, created_at, meta) VALUES (?, ?, ?, ?, ?)",
+            (meta["id"], meta["user_id"], meta.get("title") or "", meta.get("created_at") or "", json.dumps(meta)),
+        )
+
+    def get(self, story_id: str) -> dict | None:
+        row = self._conn().execute("SELECT meta FROM stories WHERE id = ?", (story_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_for_user(
+        self,
+        user_id: str,
+        limit: int | None = None,
+        offset: int = 0,
+        sort: str = "created_at",
+        descending: bool = True,
+    ) -> tuple[list[dict], int]:
+        """One page of a user's stories (all of them when limit is None) plus the user's total story count."""
+        if sort not in SORT_COLUMNS:
+            sort = "created_at"
+        direction = "DESC" if descending else "ASC"
+        conn = self._conn()
+        rows = conn.execute(
+            f"SELECT meta FROM stories WHERE user_id = ? ORDER BY {sort} {direction}, id LIMIT ? OFFSET ?",
+            (user_id, -1 if limit is None else limit, offset),  # LIMIT -1 = no limit
+        ).fetchall()
+        (total,) = conn.execute("SELECT COUNT(*) FROM stories WHERE user_id = ?", (user_id,)).fetchone()
+        return [json.loads(meta) for (meta,) in rows], total
+
+    def migrate_json_dir(self, directory: str | os.PathLike) -> int:
+        """
+        One-shot import of legacy <story_id>.json metadata files. Recorded in
+        store_migrations so later startups skip the directory scan.
+        """
+        conn = self._conn()
+        name = f"json:{os.path.abspath(directory)}"
+        if conn.execute("SELECT 1 FROM store_migrations WHERE name = ?", (name,)).fetchone():
+            return 0
+        count = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # re-check under the write lock: another worker may have just finished it
+            if conn.execute("SELECT 1 FROM store_migrations WHERE name = ?", (name,)).fetchone():
+                conn.execute("COMMIT")
+                return 0
+            for fname in os.listdir(directory):
+                if not fname.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(directory, fname)) as f:
+                        meta = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"[⚠️ Skipping unreadable story metadata] {fname}: {e}")
+                    continue
+                if not isinstance(meta, dict) or not meta.get("id") or not meta.get("user_id"):
+                    continue
+                conn.execute(
+                    "INSERT OR IGNORE INTO stories (id, user_id, title, created_at, meta) VALUES (?, ?, ?, ?, ?)",
+                    (meta["id"], meta["user_id"], meta.get("title") or "", meta.get("created_at") or "", json.dumps(meta)),
+                )
+                count += 1
+            conn.execute("INSERT INTO store_migrations (name, count) VALUES (?, ?)", (name, count))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+
+if __name__ == "__main__":
+    # usage: python story_store.py <stories_dir> [db_path]
+    stories_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join("user_data", "stories")
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join("user_data", "stories.sqlite3")
+    migrated = StoryStore(db_path).migrate_json_dir(stories_dir)
+    print(f"Migrated {migrated} story metadata file(s) into {db_path}")
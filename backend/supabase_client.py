@@ -1,5 +1,7 @@
 #importing supbase library
 import os
+import requests
+from requests.adapters import HTTPAdapter
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -14,6 +16,108 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 #to interact with database
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# At the end of the file, after line 15, add:
+
+# ---------------------------
+# pooled PostgREST access for per-user requests
+# create_client per request builds (and throws away) a new HTTP session each time,
+# so every profile read paid for a fresh connection + TLS handshake. Instead one
+# requests.Session (thread-safe connection pool) is shared and only the
+# Authorization header changes per call.
+# ---------------------------
+
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
+
+class PostgrestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"PostgREST {status}: {message}")
+        self.status = status
+
+
+class PostgrestResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class PooledRest:
+    """Shared connection pool; rest(access_token) hands out a per-request view."""
+
+    def __init__(self, url, key, pool_size=SUPABASE_POOL_SIZE, timeout=SUPABASE_TIMEOUT):
+        self.base_url = f"{(url or '').rstrip('/')}/rest/v1"
+        self.key = key
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # session-level headers are never mutated after this, so threads can share it
+        self.session.headers.update({"apikey": key, "Content-Type": "application/json"})
+
+    def rest(self, access_token=None):
+        return AuthedRest(self, access_token or self.key)
+
+
+class AuthedRest:
+    """
+    The subset of the postgrest builder the app uses, e.g.
+    rest.table("profiles").select("*").eq("id", user_id).execute().data
+    """
+
+    def __init__(self, pool, token):
+        self.pool = pool
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+class _Query:
+    def __init__(self, rest, table):
+        self.rest = rest
+        self.table = table
+        self.method = "GET"
+        self.params = {}
+        self.body = None
+        self.prefer = None
+
+    def select(self, columns="*"):
+        self.params["select"] = columns
+        return self
+
+    def eq(self, column, value):
+        self.params[column] = f"eq.{value}"
+        return self
+
+    def upsert(self, data):
+        self.method = "POST"
+        self.body = data
+        self.prefer = "resolution=merge-duplicates,return=representation"
+        return self
+
+    def execute(self):
+        pool = self.rest.pool
+        headers = dict(self.rest.headers)
+        if self.prefer:
+            headers["Prefer"] = self.prefer
+        resp = pool.session.request(
+            self.method,
+            f"{pool.base_url}/{self.table}",
+            params=self.params,
+            json=self.body,
+            headers=headers,
+            timeout=pool.timeout,
+        )
+        if resp.status_code >= 400:
+            try:
+                message = resp.json().get("message", resp.text)
+            except ValueError:
+                message = resp.text
+            raise PostgrestError(resp.status_code, message)
+        return PostgrestResponse(resp.json() if resp.content else [])
+
+
+pooled_rest = PooledRest(SUPABASE_URL, SUPABASE_KEY)
+
 # Export for debugging
-__all__ = ['supabase', 'SUPABASE_URL', 'SUPABASE_KEY']
\ No newline at end of file
+__all__ = ['supabase', 'pooled_rest', 'PostgrestError', 'SUPABASE_URL', 'SUPABASE_KEY']
\ No newline at end of file
@@ -2,10 +2,64 @@
 
 from google import genai
 from google.genai import types
-import wave, io, base64, os
+import wave, io, base64, os, struct
+from typing import AsyncIterator, Iterator
+import rate_limit
 
-# creating client to read GOOGLE_API_KEY from env
-client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+# client reads GOOGLE_API_KEY from env; created on first use so importing this module stays cheap
+# (spawned PDF pool workers import it via app.py)
+_client = None
+
+def get_client() -> genai.Client:
+    global _client
+    if _client is None:
+        _client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY'))
+    return _client
+
+TTS_MODEL = "gemini-2.5-flash-preview-tts"
+
+def _speech_config(voice_name: str) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        response_modalities=["AUDIO"],
+        speech_config=types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                    voice_name=voice_name,
+                )
+            )
+        ),
+    )
+
+def _pcm_from_part(part) -> bytes:
+    """Raw PCM bytes from an inline_data part (decoding base64 if needed)."""
+    data = part.data
+    if isinstance(data, str):
+        return base64.b64decode(data)
+    return data or b""
+
+def pcm_to_wav(pcm_data: bytes, sample_rate: int = 24000, channels: int = 1, sample_width: int = 2) -> bytes:
+    """Wrap PCM into a complete WAV container (so it is recognized by audio players)."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm_data)
+    return buffer.getvalue()
+
+def streaming_wav_header(sample_rate: int = 24000, channels: int = 1, sample_width: int = 2) -> bytes:
+    """
+    44-byte WAV header for audio of unknown length.
+    RIFF and data sizes are set to 0xFFFFFFFF, which browsers and most players
+    treat as "read until the stream ends".
+    """
+    byte_rate = sample_rate * channels * sample_width
+    block_align = channels * sample_width
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, sample_width * 8)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
 
 # fcn defining TTS synthesis
 def synthesize_tts(
@@ -19,38 +73,100 @@ def synthesize_tts(
     Returns a complete WAV file as bytes synthesized from the input text using Gemini TTS API.
     """
     # sends rq to gemini model
-    resp = client.models.generate_content(
-        model="gemini-2.5-flash-preview-tts",
+    rate_limit.acquire("gemini_tts")
+    resp = get_client().models.generate_content(
+        model=TTS_MODEL,
         contents=text,
-        config=types.GenerateContentConfig(
-            response_modalities=["AUDIO"],
-            speech_config=types.SpeechConfig(
-                voice_config=types.VoiceConfig(
-                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                        voice_name=voice_name,
-                    )
-                )
-            ),
-        ),
+        config=_speech_config(voice_name),
     )
 
     # extracting PCM (raw audio data) from gemini's response
     part = resp.candidates[0].content.parts[0].inline_data # access audio parts
-    data = part.data # base64-encoded PCM audio
+    pcm_data = _pcm_from_part(part)
 
-    # if base64 encoded, decode PCM -> bytes
-    if isinstance(data, str):
-        pcm_data = base64.b64decode(data)
-    pcm_data = data
-    
+    return pcm_to_wav(pcm_data, sample_rate, channels, sample_width)
 
-    # wrapping PCM into WAV container (so it is recognized by audio players)
-    buffer = io.BytesIO()
-    with wave.open(buffer, "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sample_width)
-        wf.setframerate(sample_rate)
-        wf.writeframes(pcm_data)
+# streaming variant: time-to-first-audio no longer grows with text length
+def synthesize_tts_stream(
+        text: str,
+        voice_name: str = 'Erinome',
+        sample_rate: int = 24000,
+        channels: int = 1,
+        sample_width: int = 2,
+) -> Iterator[bytes]:
+    """
+    Yields a streaming WAV: a header (see streaming_wav_header) followed by PCM
+    chunks as they arrive from the model. The header is only yielded once the
+    first audio chunk is in, so priming the generator with next() surfaces
+    upstream errors before any bytes are sent to the client.
+    """
+    header_sent = False
+    rate_limit.acquire("gemini_tts")
+    stream = get_client().models.generate_content_stream(
+        model=TTS_MODEL,
+        contents=text,
+        config=_speech_config(voice_name),
+    )
+    for chunk in stream:
+        for pcm in _chunk_pcm(chunk):
+            if not header_sent:
+                yield streaming_wav_header(sample_rate, channels, sample_width)
+                header_sent = True
+            yield pcm
+
+    if not header_sent:
+        raise RuntimeError("Gemini TTS returned no audio")
+
+def _chunk_pcm(chunk) -> Iterator[bytes]:
+    """Non-empty PCM payloads in one streamed response chunk."""
+    if not chunk.candidates or not chunk.candidates[0].content:
+        return
+    for part in chunk.candidates[0].content.parts or []:
+        if part.inline_data is None:
+            continue
+        pcm = _pcm_from_part(part.inline_data)
+        if pcm:
+            yield pcm
+
+# async variants for asgi_app.py (same requests through client.aio)
+async def synthesize_tts_async(
+        text: str,
+        voice_name: str = 'Erinome',
+        sample_rate: int = 24000,
+        channels: int = 1,
+        sample_width: int = 2,
+) -> bytes:
+    """synthesize_tts without holding a thread while the model works."""
+    await rate_limit.acquire_async("gemini_tts")
+    resp = await get_client().aio.models.generate_content(
+        model=TTS_MODEL,
+        contents=text,
+        config=_speech_config(voice_name),
+    )
+    part = resp.candidates[0].content.parts[0].inline_data
+    return pcm_to_wav(_pcm_from_part(part), sample_rate, channels, sample_width)
+
+async def synthesize_tts_stream_async(
+        text: str,
+        voice_name: str = 'Erinome',
+        sample_rate: int = 24000,
+        channels: int = 1,
+        sample_width: int = 2,
+) -> AsyncIterator[bytes]:
+    """Async synthesize_tts_stream: header once the first PCM chunk is in, then PCM."""
+    header_sent = False
+    await rate_limit.acquire_async("gemini_tts")
+    stream = await get_client().aio.models.generate_content_stream(
+        model=TTS_MODEL,
+        contents=text,
+        config=_speech_config(voice_name),
+    )
+    async for chunk in stream:
+        for pcm in _chunk_pcm(chunk):
+            if not header_sent:
+                yield streaming_wav_header(sample_rate, channels, sample_width)
+                header_sent = True
+            yield pcm
 
-    buffer.seek(0) # reset buffer pos
-    return buffer.read() # write to .wav file 
\ No newline at end of file
+    if not header_sent:
+        raise RuntimeError("Gemini TTS returned no audio")
@@ -177,11 +177,11 @@ def poll_job_status(job_id: str, max_wait: int = 300):
     print(f"\n⏳ Polling job status (max wait: {max_wait}s)...")
     
     start_time = time.time()
-    last_progress_count = 0
+    since = 0  # progress cursor: the server only sends entries we haven't seen
     
     while time.time() - start_time < max_wait:
         try:
-            response = requests.get(f"{JOB_STATUS_ENDPOINT}/{job_id}", timeout=10)
+            response = requests.get(f"{JOB_STATUS_ENDPOINT}/{job_id}", params={"since": since}, timeout=10)
             
             if response.status_code == 200:
                 job_data = response.json()
@@ -189,10 +189,9 @@ def poll_job_status(job_id: str, max_wait: int = 300):
                 progress = job_data.get('progress', [])
                 
                 # Print new progress messages
-                if len(progress) > last_progress_count:
-                    for msg in progress[last_progress_count:]:
-                        print(f"   📋 {msg}")
-                    last_progress_count = len(progress)
+                for msg in progress:
+                    print(f"   📋 {msg}")
+                since = job_data.get('progress_next', since)
                 
                 if status == 'done':
                     print(f"✅ Job completed successfully!")
@@ -48,6 +48,7 @@ export type StoryJobResponse = {
   result?: StoryResponse;
   error?: string;
   progress?: string[];
+  progress_next?: number;
 };
 
 export async function startStoryImageJob(
@@ -71,10 +72,49 @@ export async function startStoryImageJob(
   return res.json();
 }
 
-export async function getStoryImageJob(jobId: string): Promise<StoryJobResponse> {
-  const res = await fetch(`${API_BASE}/images/story/async/${jobId}`);
+// pass the previous response's progress_next as `since` to only get new progress lines
+export async function getStoryImageJob(jobId: string, since?: number): Promise<StoryJobResponse> {
+  const query = since ? `?since=${since}` : "";
+  const res = await fetch(`${API_BASE}/images/story/async/${jobId}${query}`);
   if (!res.ok) {
     throw new Error(await res.text());
   }
   return res.json();
 }
+
+export type StoryJobEvents = {
+  onProgress?: (message: string) => void;
+  onImage?: (image: { scene: number; completed: number; cap: number; url?: string }) => void;
+  onResult: (result: StoryResponse) => void;
+  onError: (error: string) => void;
+};
+
+// SSE alternative to polling: the server pushes only new events, and the browser resumes with
+// Last-Event-ID when the server ends a stream early. Returns a function that closes the stream.
+export function subscribeStoryImageJob(jobId: string, handlers: StoryJobEvents): () => void {
+  const source = new EventSource(`${API_BASE}/images/story/async/${jobId}/events`);
+  source.addEventListener("progress", (e) => {
+    handlers.onProgress?.(JSON.parse((e as MessageEvent).data).message);
+  });
+  source.addEventListener("image", (e) => {
+    handlers.onImage?.(JSON.parse((e as MessageEvent).data));
+  });
+  source.addEventListener("result", (e) => {
+    handlers.onResult(JSON.parse((e as MessageEvent).data).result);
+    source.close();
+  });
+  source.addEventListener("error", (e) => {
+    // a server-sent "error" event has data; a plain connection drop does not (EventSource retries those)
+    // events arrive in order, and the server sends every progress/image event logged before the
+    // failure ahead of this one, so they have all been handled by the time we close
+    const data = (e as MessageEvent).data;
+    if (data) {
+      handlers.onError(JSON.parse(data).error);
+      source.close();
+    } else if (source.readyState === EventSource.CLOSED) {
+      // the browser gave up (e.g. 404 for an unknown job) and won't reconnect
+      handlers.onError("Lost connection to the illustration job.");
+    }
+  });
+  return () => source.close();
+}
@@ -0,0 +1,52 @@
+// src/api/llm.ts
+import { API_BASE_URL } from '../config';
+
+export type CompletionEvents = {
+  onDelta?: (text: string, soFar: string) => void;
+  onSentence?: (sentence: string, index: number) => void;
+};
+
+// POSTs to one of the /stream endpoints (/api/qa-chat/stream, /api/submit-answer/stream,
+// /api/define/stream) and reads its server-sent events; resolves with the final text.
+// EventSource can't POST a body, so the SSE frames are parsed off the fetch stream.
+export async function streamCompletion(path: string, body: unknown, handlers: CompletionEvents = {}) {
+  const res = await fetch(`${API_BASE_URL}${path}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok || !res.body) {
+    // errors before the first token come back as plain JSON
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.error || `Request failed (${res.status})`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  let soFar = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const frames = buffered.split("\n\n");
+    buffered = frames.pop() ?? "";
+    for (const frame of frames) {
+      let event = "message";
+      let data = "";
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === "delta") {
+        soFar += payload.text;
+        handlers.onDelta?.(payload.text, soFar);
+      } else if (event === "sentence") handlers.onSentence?.(payload.text, payload.index);
+      else if (event === "done") return payload.text as string;
+      else if (event === "error") throw new Error(payload.error);
+    }
+  }
+  return soFar;
+}
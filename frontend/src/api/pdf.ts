@@ -0,0 +1,61 @@
+// src/api/pdf.ts
+import { API_BASE_URL } from '../config';
+
+export type UploadedStory = {
+  text: string;
+  title: string;
+  page_count: number;
+  artifact_id?: string;
+};
+
+export type UploadEvents = {
+  // called after every page with everything extracted so far
+  onProgress?: (soFar: { text: string; title: string; paragraphs: string[]; page: number }) => void;
+};
+
+// POSTs the form to /api/upload-pdf in NDJSON mode, so a long book can be shown
+// page by page while the rest is still being extracted; resolves with the final record.
+export async function uploadPdf(formData: FormData, handlers: UploadEvents = {}): Promise<UploadedStory> {
+  const res = await fetch(`${API_BASE_URL}/api/upload-pdf?stream=1`, {
+    method: "POST",
+    headers: { Accept: "application/x-ndjson" },
+    body: formData,
+  });
+  if (!res.ok || !res.body) {
+    // size/format errors are rejected before streaming starts, as plain JSON
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.error || `Upload failed (${res.status})`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  const pages: string[] = [];
+  const paragraphs: string[] = [];
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const event = JSON.parse(line);
+      if (event.type === "page") {
+        if (typeof event.text === "string") pages.push(event.text);
+        paragraphs.push(...event.paragraphs);
+        handlers.onProgress?.({
+          text: pages.join("\n"),
+          title: event.title ?? "",
+          paragraphs: [...paragraphs],
+          page: event.page,
+        });
+      } else if (event.type === "done") {
+        return event as UploadedStory;
+      } else if (event.type === "error") {
+        throw new Error(event.error);
+      }
+    }
+  }
+  throw new Error("Upload ended before the PDF was fully extracted");
+}
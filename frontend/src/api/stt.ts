@@ -0,0 +1,129 @@
+// src/api/stt.ts
+import { API_BASE_URL } from '../config';
+
+export type TranscriptEvents = {
+  onInterim?: (transcript: string) => void;
+  onFinal?: (transcript: string) => void;
+};
+
+// Streaming request bodies (`duplex: "half"`) are Chromium-only, and Chromium only sends them
+// over HTTP/2+; a plain HTTP/1.1 backend (flask dev server, gunicorn without a proxy) refuses them.
+const supportsRequestStreams = (() => {
+  try {
+    let duplexAccessed = false;
+    const hasContentType = new Request("http://localhost", {
+      body: new ReadableStream(),
+      method: "POST",
+      get duplex() {
+        duplexAccessed = true;
+        return "half";
+      },
+    } as RequestInit).headers.has("Content-Type");
+    return duplexAccessed && !hasContentType;
+  } catch {
+    return false;
+  }
+})();
+
+// Streams MediaRecorder chunks to /api/transcribe-audio/stream while recording.
+// Push chunks from `ondataavailable` into `send`, call `end` on stop; resolves with the full transcription.
+// Where the streaming upload isn't possible (no browser support, or the connection isn't HTTP/2),
+// the recorded chunks are sent to /api/transcribe-audio in one request after `end` instead.
+export function streamTranscription(handlers: TranscriptEvents = {}) {
+  const recorded: Blob[] = [];
+  let finish!: () => void;
+  const ended = new Promise<void>((resolve) => {
+    finish = resolve;
+  });
+
+  let controller: ReadableStreamDefaultController<Uint8Array> | null = null;
+  const body = new ReadableStream<Uint8Array>({
+    start(c) {
+      controller = c;
+    },
+  });
+
+  const streamed = async () => {
+    const res = await fetch(`${API_BASE_URL}/api/transcribe-audio/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "audio/webm" },
+      body,
+      duplex: "half",
+    } as RequestInit & { duplex: "half" });
+    if (!res.ok || !res.body) {
+      throw new Error(await res.text());
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = "";
+    let transcription = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split("\n");
+      buffered = lines.pop() ?? "";
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const event = JSON.parse(line);
+        if (event.type === "interim") handlers.onInterim?.(event.transcript);
+        else if (event.type === "final") handlers.onFinal?.(event.transcript);
+        else if (event.type === "done") transcription = event.transcription;
+        else if (event.type === "error") throw new Error(event.error);
+      }
+    }
+    return transcription;
+  };
+
+  const uploaded = async () => {
+    await ended;
+    const formData = new FormData();
+    formData.append("audio", new Blob(recorded, { type: "audio/webm" }), "recording.webm");
+    const res = await fetch(`${API_BASE_URL}/api/transcribe-audio`, { method: "POST", body: formData });
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.error);
+    return data.transcription as string;
+  };
+
+  const result = (async () => {
+    if (supportsRequestStreams) {
+      try {
+        return await streamed();
+      } catch (err) {
+        // fetch rejects with a TypeError when the upload itself is refused (e.g. ERR_H2_OR_QUIC_REQUIRED)
+        if (!(err instanceof TypeError)) throw err;
+        console.warn("Streaming transcription unavailable, uploading the recording instead", err);
+        controller = null;
+      }
+    }
+    return uploaded();
+  })();
+
+  // chunks are converted in order, and the body only closes after the last one is queued
+  let pending = Promise.resolve();
+  return {
+    send: (chunk: Blob) => {
+      recorded.push(chunk);
+      pending = pending.then(async () => {
+        const bytes = new Uint8Array(await chunk.arrayBuffer());
+        try {
+          controller?.enqueue(bytes);
+        } catch {
+          controller = null; // the streaming request was abandoned; the fallback has the chunks
+        }
+      });
+    },
+    end: () => {
+      pending = pending.then(() => {
+        try {
+          controller?.close();
+        } catch {
+          // already abandoned
+        }
+        finish();
+      });
+    },
+    result,
+  };
+}
@@ -9,7 +9,7 @@ import { API_BASE_URL } from '../config';
 import ImageGenerator from "../pages/ImageGenerator";
 import {
   startStoryImageJob,
-  getStoryImageJob,
+  subscribeStoryImageJob,
   type StoryImage,
   type StoryJobStatus,
 } from "../api/images";
@@ -420,40 +420,28 @@ const ExtractedText: React.FC = () => {
   useEffect(() => {
     if (!imgJobId) return;
 
-    let cancelled = false;
-
-    const interval = setInterval(async () => {
-      try {
-        const job = await getStoryImageJob(imgJobId);
-        if (cancelled) return;
-
-        setImgJobStatus(job.status);
-        if (job.progress) {
-          setImgProgress(job.progress);
-        }
-
-        if (job.status === "done" && job.result) {
-          setImages(job.result.images ?? []);
-          setImgLoading(false);
-          clearInterval(interval);
-        } else if (job.status === "error") {
-          setImgError(job.error ?? "Illustration job failed.");
-          setImgLoading(false);
-          clearInterval(interval);
-        }
-      } catch (e: any) {
-        if (cancelled) return;
-        console.error("Error polling illustration job:", e);
-        setImgError(e?.message ?? "Error checking illustration job.");
+    // the server pushes only new progress lines, so append instead of re-fetching the whole log
+    return subscribeStoryImageJob(imgJobId, {
+      onProgress: (message) => {
+        setImgJobStatus("running");
+        setImgProgress((prev) => [...prev, message]);
+      },
+      // show each illustration as it finishes; the result (with page numbers) replaces the list,
+      // and on failure the ones that did finish stay on screen
+      onImage: (image) => {
+        if (image.url) setImages((prev) => [...prev, { url: image.url! }]);
+      },
+      onResult: (result) => {
+        setImgJobStatus("done");
+        setImages(result?.images ?? []);
         setImgLoading(false);
-        clearInterval(interval);
-      }
-    }, 6000); // 6s, similar to /images page
-
-    return () => {
-      cancelled = true;
-      clearInterval(interval);
-    };
+      },
+      onError: (error) => {
+        setImgJobStatus("error");
+        setImgError(error ?? "Illustration job failed.");
+        setImgLoading(false);
+      },
+    });
   }, [imgJobId]);
 
 
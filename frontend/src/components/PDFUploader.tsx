@@ -1,13 +1,14 @@
 import React, { useState } from 'react';
 import { useReadingContext } from '../context/ReadingContext';
-import { API_BASE_URL } from '../config';
+import { API_BASE_URL, STORY_WARMUP } from '../config';
+import { uploadPdf } from '../api/pdf';
 
 const PDFUploader: React.FC = () => {
   // const { setText } = useReadingContext();
   const [loading, setLoading] = useState(false);
   const [uploaded, setUploaded] = useState(false);
   // const { setText, setTitle, setParagraphs } = useReadingContext();
-  const { setText, setTitle, setParagraphs, setFile } = useReadingContext();
+  const { setText, setTitle, setParagraphs, setFile, setArtifactId } = useReadingContext();
 
 
   const handleFileUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
@@ -19,14 +20,25 @@ const PDFUploader: React.FC = () => {
     setFile(file);
     const formData = new FormData();
     formData.append('file', file);
+    if (STORY_WARMUP !== null) formData.append('warmup', STORY_WARMUP ? 'on' : 'off');
 
     setLoading(true);
+    setArtifactId(null); // the previous story's warm-up doesn't apply to this one
     try {
-      const response = await fetch(`${API_BASE_URL}/api/upload-pdf`, { method: 'POST', body: formData });
-      const data = await response.json();
+      // pages render as they're extracted instead of after the whole book
+      let paragraphs: string[] = [];
+      const data = await uploadPdf(formData, {
+        onProgress: (soFar) => {
+          paragraphs = soFar.paragraphs;
+          setText(soFar.text);
+          setTitle(soFar.title);
+          setParagraphs(soFar.paragraphs);
+        },
+      });
       setText(data.text);
       setTitle(data.title);        // 🆕
-      setParagraphs(data.paragraphs); // 🆕
+      setParagraphs(paragraphs); // 🆕
+      setArtifactId(data.artifact_id ?? null); // quiz can come straight from the warm-up
       setUploaded(true);
       setTimeout(() => setUploaded(false), 3000); // resetting after 3s
     } catch (err) {
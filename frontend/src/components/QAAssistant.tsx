@@ -1,6 +1,8 @@
 import React, { useState, useRef } from 'react';
 import { useReadingContext } from '../context/ReadingContext';
 import { API_BASE_URL } from '../config';
+import { streamCompletion } from '../api/llm';
+import { streamTranscription } from '../api/stt';
 
 const QAAssistant: React.FC = () => {
   const { text } = useReadingContext();
@@ -10,22 +12,28 @@ const QAAssistant: React.FC = () => {
   //Added a way to track if recording or not
   //This is for visual purposes because the STT would immediately show "No speech detected" after a question was asked
   const [isRecording, setIsRecording] = useState(false); 
-  //Keep references to the recorder and audio chunks
+  //Keep a reference to the recorder
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
-  const audioChunksRef = useRef<Blob[]>([]);
 
   const handleAsk = async () => {
     if (!question || !text) return;
 
     setLoading(true);
+    setAnswer('');
     try {
-      const response = await fetch(`${API_BASE_URL}/api/qa-chat`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text, question }),
-      });
-      const data = await response.json();
-      setAnswer(data.answer);
+      // the answer renders as it streams in instead of after the whole completion
+      const finalAnswer = await streamCompletion(
+        '/api/qa-chat/stream',
+        {
+          text,
+          question,
+          // user_id/access_token let the backend tailor answers to this learner's profile
+          user_id: localStorage.getItem('user_id'),
+          access_token: localStorage.getItem('access_token'),
+        },
+        { onDelta: (_delta, soFar) => setAnswer(soFar) }
+      );
+      setAnswer(finalAnswer);
     } catch (err) {
       console.error(err);
     }
@@ -46,41 +54,46 @@ const QAAssistant: React.FC = () => {
 
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-      const mediaRecorder = new MediaRecorder(stream);
+      const mediaRecorder = new MediaRecorder(stream); //Using webm
       mediaRecorderRef.current = mediaRecorder;
-      audioChunksRef.current = [];
+
+      //Audio is transcribed while recording, so the question fills in as the child speaks
+      //(stt.ts falls back to uploading the whole recording when streaming isn't available)
+      const previousQuestion = question;
+      const finals: string[] = [];
+      const transcription = streamTranscription({
+        onInterim: (partial) => setQuestion([...finals, partial].join(' ')),
+        onFinal: (final) => {
+          finals.push(final);
+          setQuestion(finals.join(' '));
+        },
+      });
 
       mediaRecorder.ondataavailable = (e) => {
-        audioChunksRef.current.push(e.data);
+        if (e.data.size > 0) transcription.send(e.data);
       };
 
       mediaRecorder.onstop = async () => {
-        const blob = new Blob(audioChunksRef.current, { type: 'audio/webm' }); //Using webm
-        const formData = new FormData();
-        formData.append('audio', blob, 'recording.webm');
-
+        transcription.end();
         try {
-          const res = await fetch(`${API_BASE_URL}/api/transcribe-audio`, {
-            method: 'POST',
-            body: formData,
-          });
-
-          const data = await res.json();
-          if (data.transcription && data.transcription !== "No speech detected") {
-            setQuestion(data.transcription); //Only update if we got actual speech
+          const transcript = await transcription.result;
+          if (transcript && transcript !== "No speech detected") {
+            setQuestion(transcript); //Only update if we got actual speech
           } else {
             //Keep the existing question if no speech was detected
             console.log("No speech detected, keeping previous question");
+            setQuestion(previousQuestion);
           }
         } catch (err) {
           console.error("Transcription failed:", err);
+          setQuestion(previousQuestion);
         } finally {
           setIsRecording(false);
           stream.getTracks().forEach(track => track.stop());
         }
       };
 
-      mediaRecorder.start();
+      mediaRecorder.start(250); //timeslice: hand over audio every 250ms instead of only at stop
     } catch (err) {
       console.error("Mic access denied or failed", err);
       alert("Please allow microphone access to use this feature.");
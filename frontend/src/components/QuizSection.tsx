@@ -6,7 +6,7 @@ import GuideCard from './GuideCard';
 import { API_BASE_URL } from '../config';
 
 const QuizSection: React.FC = () => {
-  const { text } = useReadingContext();
+  const { text, artifactId } = useReadingContext();
   const [questions, setQuestions] = useState<string[]>([]);
   const [answers, setAnswers] = useState<string[]>([]);
   const [feedbacks, setFeedbacks] = useState<string[]>([]);
@@ -19,7 +19,8 @@ const QuizSection: React.FC = () => {
     const response = await fetch(`${API_BASE_URL}/api/generate-quiz`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ text }),
+      // artifact_id lets the backend answer from the story's warm-up instead of calling Gemini
+      body: JSON.stringify({ text, artifact_id: artifactId }),
     });
     const data = await response.json();
     setQuestions(data.questions);
@@ -44,6 +45,38 @@ const QuizSection: React.FC = () => {
     setFeedbacks(updatedFeedbacks);
   };
 
+  // grades every answered question in one request (one Gemini call on the backend)
+  const submitAll = async () => {
+    const answered = questions
+      .map((question, index) => ({ index, question, answer: answers[index] }))
+      .filter((item) => item.answer && item.answer.trim());
+    if (answered.length === 0) return;
+
+    setLoading(true);
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/submit-answers`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          text,
+          items: answered.map(({ question, answer }) => ({ question, answer })),
+        }),
+      });
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error);
+
+      const updatedFeedbacks = [...feedbacks];
+      answered.forEach((item, i) => {
+        const result = data.results[i];
+        updatedFeedbacks[item.index] = result.feedback ?? result.error;
+      });
+      setFeedbacks(updatedFeedbacks);
+    } catch (err) {
+      console.error("Batch grading failed", err);
+    }
+    setLoading(false);
+  };
+
   const handleRecord = async (index: number) => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
@@ -159,6 +192,14 @@ const QuizSection: React.FC = () => {
         </div>
       )}
 
+      {questions.length > 0 && (
+        <div style={{ display: "flex", justifyContent: "flex-end", marginBottom: "1rem" }}>
+          <button className="primary" onClick={submitAll} disabled={loading}>
+            {loading ? "Checking…" : "✅ Submit All"}
+          </button>
+        </div>
+      )}
+
       {/* === Questions + Input + Feedback === */}
       {questions.map((q, i) => (
         <div key={i} className="qa-box mt-6">
@@ -5,4 +5,8 @@
 export const API_BASE_URL =
   window.location.hostname === "localhost" || window.location.hostname === "127.0.0.1"
     ? "http://localhost:5000"
-    : "https://ai4good.onrender.com";
\ No newline at end of file
+    : "https://ai4good.onrender.com";
+
+// Ask the backend to warm up each uploaded story (quiz + opening sentence audio) in the background.
+// Set to null to leave it to the backend's STORY_WARMUP default.
+export const STORY_WARMUP: boolean | null = true;
\ No newline at end of file
@@ -29,6 +29,9 @@ interface ReadingContextProps {
   setTitle: (t: string) => void;
   paragraphs: string[];
   setParagraphs: (p: string[]) => void;
+  //id of the story's warm-up artifacts (null when the upload wasn't warmed up)
+  artifactId: string | null;
+  setArtifactId: (id: string | null) => void;
 }
 
 const ReadingContext = createContext<ReadingContextProps | undefined>(
@@ -49,6 +52,7 @@ export const ReadingProvider = ({ children }: { children: ReactNode }) => {
 
   const [title,       setTitle]       = useState<string>("");
   const [paragraphs,  setParagraphs]  = useState<string[]>([]);
+  const [artifactId,  setArtifactId]  = useState<string | null>(null);
   return (
     <ReadingContext.Provider
       value={{
@@ -58,6 +62,7 @@ export const ReadingProvider = ({ children }: { children: ReactNode }) => {
         setText,
         title, setTitle,
         paragraphs, setParagraphs,
+        artifactId, setArtifactId,
         questions,
         setQuestions,
         answers,
@@ -58,7 +58,7 @@
 
 
 import React, { useState, useEffect } from "react";
-import { generateImagesFromPdf, type StoryImage, startStoryImageJob, getStoryImageJob, type StoryJobStatus } from "../api/images"; // <-- match path & names
+import { generateImagesFromPdf, type StoryImage, startStoryImageJob, subscribeStoryImageJob, type StoryJobStatus } from "../api/images"; // <-- match path & names
 
 export default function ImageGenerator() {
   const [pdf, setPdf] = useState<File | null>(null);
@@ -98,41 +98,31 @@ export default function ImageGenerator() {
     //   setLoading(false);
     // }
   };
-  // polling effect
+  // job events (server-sent): new progress lines are appended as they arrive
   useEffect(() => {
     if (!jobId) return;
 
-    let cancelled = false;
-    const interval = setInterval(async () => {
-      try {
-        const job = await getStoryImageJob(jobId);
-        if (cancelled) return;
-        setJobStatus(job.status);
-        if(job.progress){
-          setProgress(job.progress);
-        }
-
-        if (job.status === "done" && job.result) {
-          setImages(job.result.images ?? []);
-          setLoading(false);
-          clearInterval(interval);
-        } else if (job.status === "error") {
-          setError(job.error ?? "Job failed.");
-          setLoading(false);
-          clearInterval(interval);
-        }
-      } catch (e: any) {
-        if (cancelled) return;
-        setError(e?.message ?? "Error polling job.");
+    return subscribeStoryImageJob(jobId, {
+      onProgress: (message) => {
+        setJobStatus("running");
+        setProgress((prev) => [...prev, message]);
+      },
+      // show each illustration as it finishes; the result (with page numbers) replaces the list,
+      // and on failure the ones that did finish stay on screen
+      onImage: (image) => {
+        if (image.url) setImages((prev) => [...prev, { url: image.url! }]);
+      },
+      onResult: (result) => {
+        setJobStatus("done");
+        setImages(result?.images ?? []);
         setLoading(false);
-        clearInterval(interval);
-      }
-    },6000); // poll every 5s
-
-    return () => {
-      cancelled = true;
-      clearInterval(interval);
-    };
+      },
+      onError: (error) => {
+        setJobStatus("error");
+        setError(error ?? "Job failed.");
+        setLoading(false);
+      },
+    });
   }, [jobId]);
 
   return (